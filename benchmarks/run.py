@@ -0,0 +1,246 @@
+"""Benchmarks for the network and coordinator paths.
+
+Runs against the local controller simulator, so no hardware is needed.
+Home Assistant has to be installed (pip install homeassistant), because
+the coordinator and entities are exercised for real:
+
+    python -m benchmarks.run --output bench_output.json
+
+Measured:
+
+- discovery: DomestiaDiscovery.load_all for 16, 64, 128 and 255 outputs
+- poll: one coordinator update cycle (ATRRELAIS round trip and decoding)
+- light_turn_on / cover_set_position: command until the polled status
+  confirms the new state
+- burst: many light commands at once until all are confirmed
+
+Results are written as JSON so runs can be compared between releases.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.domestia import network as domestia_network
+from custom_components.domestia.coordinator import DomestiaCoordinator
+from custom_components.domestia.cover import DomestiaCover
+from custom_components.domestia.discovery import DomestiaDiscovery
+from custom_components.domestia.light import DomestiaLight
+from custom_components.domestia.network import DomestiaNetwork
+from tools.simulator import DomestiaSimulator
+
+SIZES = (16, 64, 128, 255)
+CONFIRM_TIMEOUT = 10  # seconds
+
+
+def summarize(samples):
+    """Timing statistics in milliseconds."""
+    ms = sorted(s * 1000 for s in samples)
+    return {
+        "runs": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "median_ms": round(statistics.median(ms), 3),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+        "min_ms": round(ms[0], 3),
+        "max_ms": round(ms[-1], 3),
+    }
+
+
+def bench_lights(coordinator):
+    """Lights to drive; output 0 is skipped because its status byte is the
+    frame length as the integration reads the ATRRELAIS reply."""
+    return [output for output in coordinator.outputs.category("light") if output.id > 0]
+
+
+async def wait_for(condition):
+    deadline = time.perf_counter() + CONFIRM_TIMEOUT
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("State not confirmed")
+        await asyncio.sleep(0.001)
+
+
+class Bench:
+    """One simulator with a connected network, discovery and coordinator."""
+
+    def __init__(self, hass, outputs, latency, travel_time):
+        self.hass = hass
+        self.simulator = DomestiaSimulator(outputs=outputs, latency=latency, travel_time=travel_time)
+        self.network = None
+        self._coordinators = []
+
+    async def __aenter__(self):
+        domestia_network.PORT_TCP = await self.simulator.start()
+        self.network = DomestiaNetwork("127.0.0.1", "00:11:22:33:44:55")
+        await self.network.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        # Stop polling before the network goes, or the next benchmarks
+        # share the event loop with coordinators polling a closed network
+        for coordinator, remove_listener in self._coordinators:
+            remove_listener()
+            coordinator.unsub_network()
+            coordinator.transitions.cancel()
+            coordinator.commands.cancel()
+            await coordinator.async_shutdown()
+        await self.network.disconnect()
+        await self.simulator.stop()
+
+    async def coordinator(self, scan_interval=1):
+        outputs = await DomestiaDiscovery(self.network).load_all()
+        coordinator = DomestiaCoordinator(self.hass, self.network, outputs, scan_interval, False)
+        # A listener keeps the coordinator's own poll schedule running
+        remove_listener = coordinator.async_add_listener(lambda: None)
+        self._coordinators.append((coordinator, remove_listener))
+        await coordinator.async_refresh()
+        return coordinator
+
+    def entity(self, entity_class, coordinator, output, platform_name):
+        entity = entity_class(coordinator, self.network, output)
+        entity.hass = self.hass
+        entity.entity_id = f"{platform_name}.bench_{output.id}"
+        return entity
+
+
+async def bench_discovery(hass, args):
+    results = {}
+    for size in SIZES:
+        async with Bench(hass, size, args.latency, args.travel_time) as bench:
+            samples = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                await DomestiaDiscovery(bench.network).load_all()
+                samples.append(time.perf_counter() - start)
+            results[str(size)] = summarize(samples)
+    return results
+
+
+async def bench_poll(hass, args):
+    results = {}
+    for size in SIZES:
+        async with Bench(hass, size, args.latency, args.travel_time) as bench:
+            coordinator = await bench.coordinator()
+            samples = []
+            for _ in range(args.runs * 10):
+                start = time.perf_counter()
+                await coordinator._async_update_data()
+                samples.append(time.perf_counter() - start)
+            results[str(size)] = summarize(samples)
+    return results
+
+
+async def bench_light(hass, args):
+    async with Bench(hass, args.outputs, args.latency, args.travel_time) as bench:
+        coordinator = await bench.coordinator()
+        output = bench_lights(coordinator)[0]
+        light = bench.entity(DomestiaLight, coordinator, output, "light")
+        simulated = bench.simulator.outputs[output.id]
+
+        samples = []
+        for i in range(args.runs * 5):
+            on = i % 2 == 0
+            start = time.perf_counter()
+            if on:
+                await light.async_turn_on()
+            else:
+                await light.async_turn_off()
+            await wait_for(lambda: bool(simulated.value) == on and output.id not in coordinator._expected)
+            samples.append(time.perf_counter() - start)
+        return summarize(samples)
+
+
+async def bench_cover(hass, args):
+    async with Bench(hass, args.outputs, args.latency, args.travel_time) as bench:
+        coordinator = await bench.coordinator()
+        output = coordinator.outputs.category("cover")[0]
+        cover = bench.entity(DomestiaCover, coordinator, output, "cover")
+
+        samples = []
+        for i in range(args.runs):
+            target = 100 if i % 2 == 0 else 0
+            start = time.perf_counter()
+            await cover.async_set_cover_position(position=target)
+            await wait_for(lambda: output.position == target and not output.opening and not output.closing)
+            samples.append(time.perf_counter() - start)
+        return summarize(samples)
+
+
+async def bench_burst(hass, args):
+    async with Bench(hass, args.outputs, args.latency, args.travel_time) as bench:
+        coordinator = await bench.coordinator()
+        lights = [
+            bench.entity(DomestiaLight, coordinator, output, "light")
+            for output in bench_lights(coordinator)
+        ][:args.burst]
+
+        start = time.perf_counter()
+        await asyncio.gather(*(light.async_turn_on() for light in lights))
+        sent = time.perf_counter() - start
+        await wait_for(lambda: not coordinator._expected and all(
+            bench.simulator.outputs[light.output.id].value for light in lights
+        ))
+        confirmed = time.perf_counter() - start
+
+        return {
+            "commands": len(lights),
+            "sent_ms": round(sent * 1000, 3),
+            "confirmed_ms": round(confirmed * 1000, 3),
+            "commands_per_s": round(len(lights) / confirmed, 1),
+        }
+
+
+BENCHMARKS = {
+    "discovery": bench_discovery,
+    "poll": bench_poll,
+    "light_turn_on": bench_light,
+    "cover_set_position": bench_cover,
+    "burst": bench_burst,
+}
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+
+        results = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "latency_s": args.latency,
+                "travel_time_s": args.travel_time,
+                "runs": args.runs,
+            },
+        }
+
+        for name in args.only or BENCHMARKS:
+            print(f"Running {name}...", file=sys.stderr)
+            results[name] = await BENCHMARKS[name](hass, args)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Domestia integration benchmarks")
+    parser.add_argument("--output", default="bench_output.json", help="JSON results file")
+    parser.add_argument("--runs", type=int, default=5, help="repetitions per measurement")
+    parser.add_argument("--outputs", type=int, default=64, help="outputs for the command benchmarks")
+    parser.add_argument("--burst", type=int, default=32, help="light commands in the burst benchmark")
+    parser.add_argument("--latency", type=float, default=0.002, help="simulated controller latency in seconds")
+    parser.add_argument("--travel-time", type=float, default=1.0, help="simulated shutter travel time in seconds")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="run only these benchmarks")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(_parse_args()))
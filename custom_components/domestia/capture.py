@@ -0,0 +1,73 @@
+"""Wire capture of the raw controller traffic.
+
+While a capture runs, DomestiaNetwork appends every written frame and
+every received chunk to a bounded ring buffer, with a monotonic timestamp.
+Nothing is formatted until the buffer is written out, so a capture can be
+left running in production. tools/replay.py reads the files back.
+"""
+
+import json
+import time
+from collections import deque
+
+CAPTURE_VERSION = 1
+DEFAULT_CAPTURE_SIZE = 10000  # frames and received chunks kept
+
+TX = "tx"
+RX = "rx"
+
+
+class WireCapture:
+    """Ring buffer of (timestamp, direction, bytes)."""
+
+    def __init__(self, max_frames=DEFAULT_CAPTURE_SIZE):
+        self.started = time.monotonic()
+        self.started_at = time.time()
+        self._frames = deque(maxlen=max_frames)
+
+    def __len__(self):
+        return len(self._frames)
+
+    def record(self, direction, data):
+        self._frames.append((time.monotonic(), direction, data))
+
+    def snapshot(self):
+        """Copy of the buffer, safe to write out from another thread."""
+        return list(self._frames)
+
+
+def write_capture(path, header, capture, frames):
+    """Write a capture as JSON lines: a header, then one line per frame.
+
+    Blocking, run it in the executor.
+    """
+    header = {
+        "version": CAPTURE_VERSION,
+        "started_at": capture.started_at,
+        **header,
+    }
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(header) + "\n")
+        for timestamp, direction, data in frames:
+            f.write(json.dumps({
+                "t": round(timestamp - capture.started, 6),
+                "dir": direction,
+                "data": data.hex(),
+            }) + "\n")
+
+
+def read_capture(path):
+    """Return (header, [(t, direction, bytes), ...]) from a capture file."""
+    with open(path, encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("version") != CAPTURE_VERSION:
+            raise ValueError(f"Unsupported capture version {header.get('version')}")
+
+        frames = []
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                frames.append((record["t"], record["dir"], bytes.fromhex(record["data"])))
+
+    return header, frames
@@ -4,44 +4,43 @@ from homeassistant.components.climate import (
     HVACMode,
 )
 from homeassistant.const import UnitOfTemperature
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 from .const import DOMAIN
+from .protocol import build_write_setpoint, build_write_mode, CHAUD_AUTO, CHAUD_VEROUILLE
 
 
 async def async_setup_entry(hass, entry, add_entities):
     """Set up Domestia climate devices."""
     data = hass.data[DOMAIN][entry.entry_id]
     network = data["network"]
-    accessories = data["accessories"]
+    outputs = data["outputs"]
+    coordinator = data["coordinator"]
 
-    climates = []
-
-    for acc in accessories:
-        # Domestia thermostaat = RELAIS_CAPTEUR (type 11)
-        if acc["type"] == 11:
-            climates.append(DomestiaClimate(network, acc))
+    # Domestia thermostaat = RELAIS_CAPTEUR (type 11)
+    climates = [
+        DomestiaClimate(coordinator, network, output)
+        for output in outputs.category("climate")
+    ]
 
     add_entities(climates)
 
 
-class DomestiaClimate(ClimateEntity):
+class DomestiaClimate(CoordinatorEntity, ClimateEntity):
     """Representation of a Domestia thermostat."""
 
-    def __init__(self, network, acc):
+    def __init__(self, coordinator, network, output):
+        super().__init__(coordinator, context=output.id)
         self.network = network
-        self.acc = acc
-
-        self._hvac_mode = HVACMode.HEAT
-        self._target_temp = 20
-        self._current_temp = 20
+        self.output = output
 
     @property
     def name(self):
-        return f"Domestia Thermostat {self.acc['id']}"
+        return f"Domestia Thermostat {self.output.id}"
 
     @property
     def unique_id(self):
-        return f"domestia_climate_{self.acc['id']}"
+        return f"domestia_climate_{self.output.id}"
 
     @property
     def temperature_unit(self):
@@ -57,53 +56,34 @@ class DomestiaClimate(ClimateEntity):
 
     @property
     def hvac_mode(self):
-        return self._hvac_mode
+        if self.output.mode == CHAUD_VEROUILLE:
+            return HVACMode.OFF
+        return HVACMode.HEAT
 
     @property
     def current_temperature(self):
-        return self._current_temp
+        return self.output.temperature
 
     @property
     def target_temperature(self):
-        return self._target_temp
+        return self.output.target_temperature
 
     # ---------------------------------------------------------
     # ACTIONS
     # ---------------------------------------------------------
     async def async_set_temperature(self, **kwargs):
         if "temperature" in kwargs:
-            self._target_temp = kwargs["temperature"]
-
-            # Domestia expects target temp * 2
-            value = round(self._target_temp * 2)
-
-            await self.network.send([
-                255,0,0,3,
-                58,  # ATWTEMPMODE
-                self.acc["id"] + 1,
-                value
-            ])
+            self.output.target_temperature = kwargs["temperature"]
+            await self.coordinator.commands.send(
+                self.output.id, build_write_setpoint(self.output.id, self.output.target_temperature)
+            )
 
         self.async_write_ha_state()
+        self.coordinator.refresh_thermostats()
 
     async def async_set_hvac_mode(self, hvac_mode):
-        self._hvac_mode = hvac_mode
-
-        if hvac_mode == HVACMode.OFF:
-            # Domestia: CHAUD_VEROUILLE (2)
-            await self.network.send([
-                255,0,0,3,
-                85,  # ATWCAPTEURMODE
-                self.acc["id"] + 1,
-                2
-            ])
-        else:
-            # Domestia: CHAUD_AUTO (0)
-            await self.network.send([
-                255,0,0,3,
-                85,
-                self.acc["id"] + 1,
-                0
-            ])
-
-        self.async_write_ha_state()
\ No newline at end of file
+        self.output.mode = CHAUD_VEROUILLE if hvac_mode == HVACMode.OFF else CHAUD_AUTO
+        await self.coordinator.commands.send(self.output.id, build_write_mode(self.output.id, self.output.mode))
+
+        self.async_write_ha_state()
+        self.coordinator.refresh_thermostats()
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""Last-write-wins debouncing of output writes.
+
+Dragging a slider in the UI calls the entity many times a second. The
+first write of a gesture goes out at once; writes for the same output and
+command within COMMAND_DEBOUNCE after it only replace the value waiting to
+be sent, and the latest one goes out when the interval ends. So a value
+is never more than COMMAND_DEBOUNCE late, and intermediate values are
+never sent at all.
+"""
+
+import logging
+import time
+
+from .const import COMMAND_DEBOUNCE
+from .network import DomestiaConnectionError
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class _Slot:
+    """Write state of one output and command."""
+
+    __slots__ = ("sent_at", "request", "timer")
+
+    def __init__(self):
+        self.sent_at = 0.0
+        self.request = None  # Waiting to be sent
+        self.timer = None
+
+
+class CommandDebouncer:
+    """Coalesces writes per output for one controller."""
+
+    def __init__(self, hass, network, delay=COMMAND_DEBOUNCE):
+        self.hass = hass
+        self.network = network
+        self.delay = delay
+        self.coalesced = 0
+
+        # (output id, command) -> _Slot
+        self._slots = {}
+
+    async def send(self, output_id, request):
+        """Send a write, or replace the one this output has waiting."""
+        key = (output_id, request.command)
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = _Slot()
+
+        if slot.request is not None:
+            self.coalesced += 1
+            slot.request = request
+            return
+
+        elapsed = time.monotonic() - slot.sent_at
+        if elapsed >= self.delay:
+            slot.sent_at = time.monotonic()
+            await self.network.send(request)
+            return
+
+        slot.request = request
+        slot.timer = self.hass.loop.call_later(self.delay - elapsed, self._flush, key)
+
+    def cancel(self, output_id=None):
+        """Drop waiting writes, of one output or of all."""
+        for key, slot in list(self._slots.items()):
+            if output_id is not None and key[0] != output_id:
+                continue
+            if slot.timer is not None:
+                slot.timer.cancel()
+            del self._slots[key]
+
+    def _flush(self, key):
+        slot = self._slots.get(key)
+        if slot is None or slot.request is None:
+            return
+
+        request = slot.request
+        slot.request = None
+        slot.timer = None
+        slot.sent_at = time.monotonic()
+        self.hass.async_create_task(self._send(request))
+
+    async def _send(self, request):
+        try:
+            await self.network.send(request)
+        except DomestiaConnectionError as e:
+            _LOGGER.warning(f"Write dropped: {e}")
@@ -2,7 +2,7 @@ import voluptuous as vol
 from homeassistant import config_entries
 from homeassistant.core import callback
 
-from .const import DOMAIN, CONF_IP, CONF_MAC, DEFAULT_SCAN_INTERVAL, DEFAULT_DEBUG_MODE
+from .const import DOMAIN, CONF_IP, CONF_MAC, DEFAULT_SCAN_INTERVAL, DEFAULT_DEBUG_MODE, DEFAULT_COVER_MODEL
 
 
 class DomestiaConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
@@ -43,6 +43,7 @@ class DomestiaOptionsFlowHandler(config_entries.OptionsFlow):
         # Get current values or defaults
         current_interval = self._entry.options.get("scan_interval", DEFAULT_SCAN_INTERVAL)
         current_debug = self._entry.options.get("debug_mode", DEFAULT_DEBUG_MODE)
+        current_cover_model = self._entry.options.get("cover_model", DEFAULT_COVER_MODEL)
         
         schema = vol.Schema({
             vol.Optional(
@@ -54,6 +55,11 @@ class DomestiaOptionsFlowHandler(config_entries.OptionsFlow):
                 "debug_mode",
                 default=current_debug,
                 description="Enable detailed logging for troubleshooting"
+            ): bool,
+            vol.Optional(
+                "cover_model",
+                default=current_cover_model,
+                description="Estimate shutter positions between polls"
             ): bool
         })
         
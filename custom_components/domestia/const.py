@@ -4,8 +4,32 @@ CONF_IP = "ip"
 CONF_MAC = "mac"
 CONF_SCAN_INTERVAL = "scan_interval"
 CONF_DEBUG_MODE = "debug_mode"
+CONF_COVER_MODEL = "cover_model"
 
 PORT_TCP = 52001
 
 DEFAULT_SCAN_INTERVAL = 5  # seconds
+FAST_SCAN_INTERVAL = 0.5  # seconds, while covers move or after a command
+FAST_SCAN_RTT_FACTOR = 10  # fast polls are at least this many round trips apart
+CLIMATE_SCAN_INTERVAL = 60  # seconds between thermostat polls
+CLIMATE_MAX_FAILURES = 3  # unanswered or invalid thermostat reads before they stop
+PUSH_SAFETY_INTERVAL = 60  # seconds between polls while the controller pushes changes
+COVER_MODEL_SCAN_INTERVAL = 2  # seconds, while covers move and the travel model fills in
+COVER_UPDATE_INTERVAL = 1  # seconds between estimated cover positions
+CONFIRM_DELAY = 0.3  # seconds, commands in this window share one poll
+CONFIRM_TIMEOUT = 3.0  # seconds before unconfirmed optimistic state is dropped
+TRANSITION_TICK = 0.1  # seconds between dimmer transition steps
+MAX_FADE_WRITES_PER_SECOND = 20  # level writes for all running transitions together
+COMMAND_DEBOUNCE = 0.15  # seconds, newer writes to an output replace unsent ones
 DEFAULT_DEBUG_MODE = False  # Disable verbose logging by default
+DEFAULT_COVER_MODEL = False  # Estimate cover positions between polls
+
+DEFAULT_REQUEST_TIMEOUT = 3.0  # seconds to wait for a reply
+DEFAULT_MAX_IN_FLIGHT = 16  # upper bound of the adaptive request window
+
+STORAGE_VERSION = 1
+
+SERVICE_REDISCOVER = "rediscover"
+SERVICE_SET_OUTPUTS = "set_outputs"
+SERVICE_START_CAPTURE = "start_capture"
+SERVICE_DUMP_CAPTURE = "dump_capture"
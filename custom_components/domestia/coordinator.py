@@ -0,0 +1,468 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.debounce import Debouncer
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+
+from .const import (
+    DOMAIN,
+    FAST_SCAN_INTERVAL,
+    FAST_SCAN_RTT_FACTOR,
+    COVER_MODEL_SCAN_INTERVAL,
+    CLIMATE_SCAN_INTERVAL,
+    CLIMATE_MAX_FAILURES,
+    PUSH_SAFETY_INTERVAL,
+    CONFIRM_DELAY,
+    CONFIRM_TIMEOUT,
+)
+from .network import (
+    DomestiaConnectionError,
+    PRIORITY_CONFIRM,
+    PRIORITY_POLL,
+    STATE_CONNECTED,
+    STATE_DISCONNECTED,
+)
+from .commands import CommandDebouncer
+from .transitions import DimmerTransitions
+from .protocol import (
+    HEADER_SIZE,
+    decode_status_table,
+    decode_temperatures,
+    decode_thermostat_status,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class DomestiaCoordinator(DataUpdateCoordinator):
+    """Polls ATRRELAIS and notifies only the entities whose output changed.
+
+    Entities subscribe with their output id as context. When a poll returns
+    identical status bytes nothing is notified, otherwise only the listeners
+    of the changed outputs are called.
+    """
+
+    def __init__(self, hass: HomeAssistant, network, outputs, scan_interval, debug_mode, cover_model=False):
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=DOMAIN,
+            update_interval=timedelta(seconds=scan_interval),
+            always_update=False,
+            request_refresh_debouncer=Debouncer(
+                hass, _LOGGER, cooldown=CONFIRM_DELAY, immediate=False
+            ),
+        )
+        self.network = network
+        self.outputs = outputs
+        self.debug_mode = debug_mode
+        self.cover_model = cover_model
+        self.idle_interval = scan_interval
+        self._interval = scan_interval
+
+        # Output ids changed by the last poll, None = notify everyone
+        self.changed_ids = None
+
+        # Output id -> optimistic state waiting for confirmation
+        self._expected = {}
+
+        # Thermostat timer, started by the first successful poll
+        self._climate_due = 0  # Monotonic time of the next thermostat read
+        self._climate_failures = 0
+        self._climate_stopped = False
+        self._unsub_climate = None
+        self._thermostat_refresh = Debouncer(
+            hass, _LOGGER, cooldown=CONFIRM_DELAY, immediate=False,
+            function=self.async_read_thermostats,
+        )
+
+        # Dimmer fades, confirmed with one poll when the last one ends
+        self.transitions = DimmerTransitions(hass, network, self.async_request_refresh)
+
+        # Entity writes, so slider gestures only send their latest value
+        self.commands = CommandDebouncer(hass, network)
+
+        # The controller reports changes itself
+        self.push_active = False
+
+        unsub_state = network.add_state_listener(self._connection_state_changed)
+        unsub_push = network.add_push_listener(self._handle_push)
+
+        def unsub_network():
+            unsub_state()
+            unsub_push()
+            self._stop_thermostats()
+
+        self.unsub_network = unsub_network
+
+    async def _async_update_data(self):
+        """Fetch data from Domestia."""
+        start = time.monotonic()
+        states = await self._async_poll()
+        self.network.metrics.poll_duration.record(time.monotonic() - start)
+        self._adapt_interval(states is not self.data)
+
+        if states is not None and self._unsub_climate is None and not self._climate_stopped:
+            self._start_thermostats()
+
+        return states
+
+    # ---------------------------------------------------------
+    # THERMOSTATS
+    # ---------------------------------------------------------
+    # Read by their own CLIMATE_SCAN_INTERVAL timer as one pipelined pair of
+    # requests, so the relay poll never waits for them. After
+    # CLIMATE_MAX_FAILURES bad reads in a row they are no longer read.
+    @callback
+    def _thermostat_interval(self, now):
+        self.refresh_thermostats()
+
+    def _start_thermostats(self):
+        """First read as soon as the controller answers, then by timer."""
+        if not self.outputs.category("climate"):
+            return
+
+        self._unsub_climate = async_track_time_interval(
+            self.hass, self._thermostat_interval, timedelta(seconds=CLIMATE_SCAN_INTERVAL)
+        )
+        self.refresh_thermostats()
+
+    @callback
+    def refresh_thermostats(self):
+        """Read the thermostats soon, e.g. after a write; calls within
+        CONFIRM_DELAY share one read."""
+        if self._unsub_climate is None:
+            return
+        self.hass.async_create_task(self._async_schedule_thermostats())
+
+    async def _async_schedule_thermostats(self):
+        # Checked again here: the thermostats may have been stopped between
+        # queueing this task and running it
+        if self._unsub_climate is not None:
+            await self._thermostat_refresh.async_call()
+
+    def _stop_thermostats(self):
+        """Stop reading thermostats for good."""
+        self._climate_stopped = True
+        if self._unsub_climate is not None:
+            self._unsub_climate()
+            self._unsub_climate = None
+        self._thermostat_refresh.async_cancel()
+
+    async def async_read_thermostats(self):
+        """Read all thermostats and notify the entities that changed."""
+        if self._unsub_climate is None:
+            return
+
+        self._climate_due = time.monotonic() + CLIMATE_SCAN_INTERVAL
+
+        try:
+            temperatures, status = await self.network.read_thermostats()
+            changed_ids = self.outputs.apply_thermostats(
+                decode_temperatures(temperatures), decode_thermostat_status(status)
+            )
+        except asyncio.TimeoutError:
+            self._thermostat_failed("no reply")
+            return
+        except ValueError as e:
+            self._thermostat_failed(str(e))
+            return
+        except DomestiaConnectionError:
+            # Read again on the next tick once the connection is back
+            return
+
+        self._climate_failures = 0
+
+        if self.debug_mode:
+            for output_id in changed_ids:
+                output = self.outputs[output_id]
+                _LOGGER.debug(
+                    f"Thermostat {output.id}: temp={output.temperature}, "
+                    f"target={output.target_temperature}, mode={output.mode}"
+                )
+
+        # Thermostats are not part of the relay data, notify them directly
+        self.async_notify_outputs(changed_ids)
+
+    def _thermostat_failed(self, reason):
+        self._climate_failures += 1
+        if self._climate_failures < CLIMATE_MAX_FAILURES:
+            _LOGGER.warning(f"Thermostat read failed: {reason}")
+            return
+
+        _LOGGER.warning(
+            f"Thermostat read failed {self._climate_failures} times ({reason}), "
+            "no longer reading thermostats until the integration is reloaded"
+        )
+        self._stop_thermostats()
+
+    async def _async_poll(self):
+        if self.debug_mode:
+            _LOGGER.debug("Polling states...")
+
+        try:
+            # Polls confirming a command go before routine polls
+            priority = PRIORITY_CONFIRM if self._expected else PRIORITY_POLL
+            data = await self.network.read_relais_status(priority=priority)
+        except asyncio.TimeoutError:
+            _LOGGER.warning("Timeout waiting for state response")
+            return self.data
+        except DomestiaConnectionError as e:
+            raise UpdateFailed(str(e)) from e
+
+        return self._process_status(data, polled=True)
+
+    def _process_status(self, data, polled):
+        """Apply a status frame, return the new status table.
+
+        Returns the current data object when nothing changed, so HA does
+        not call any listener.
+        """
+        if len(data) <= HEADER_SIZE:
+            if self.debug_mode:
+                _LOGGER.warning(f"Response too short, length={len(data)}")
+            return self.data
+
+        states = decode_status_table(data)
+        previous = self.data
+
+        # Nothing changed: keep the old object so no listener is called
+        if states == previous and not self._expected:
+            return previous
+
+        if self.debug_mode:
+            _LOGGER.debug(f"States length={len(states)}, first 20: {list(states[:20])}")
+
+        if previous is None or len(previous) != len(states):
+            changed_bytes = range(len(states))
+        else:
+            changed_bytes = [i for i, (old, new) in enumerate(zip(previous, states)) if old != new]
+
+        check_push = polled and self.push_active
+        if check_push:
+            # Covers already on their way report new positions by themselves
+            moving = {o.id for o in self.outputs.category("cover") if o.closing or o.opening}
+
+        changed_ids = self.outputs.apply_status(states, changed_bytes)
+        if check_push:
+            self._check_push_missed(changed_ids, moving)
+        if self._expected:
+            self._check_expected(states, changed_ids)
+
+        if self.debug_mode:
+            for output_id in changed_ids:
+                output = self.outputs[output_id]
+                _LOGGER.debug(
+                    f"Output {output.id} ({output.name}): on={output.is_on}, "
+                    f"pos={output.position}, closing={output.closing}, opening={output.opening}"
+                )
+
+        if states == previous:
+            # Only optimistic states were rolled back; HA will not notify
+            # for equal data, so do it here
+            self.async_notify_outputs(changed_ids)
+            return previous
+
+        # After a failed update every entity has to write its availability
+        self.changed_ids = changed_ids if self.last_update_success else None
+        return states
+
+    # ---------------------------------------------------------
+    # PUSHED STATUS
+    # ---------------------------------------------------------
+    # Pushed frames are applied like a poll, and polling drops to a
+    # PUSH_SAFETY_INTERVAL safety poll. A change no push reported puts
+    # polling back to normal until the next push.
+    @callback
+    def _handle_push(self, frame):
+        if not self.push_active:
+            _LOGGER.info(f"Controller pushes status changes, polling every {PUSH_SAFETY_INTERVAL}s")
+            self.push_active = True
+
+        states = self._process_status(frame, polled=False)
+        self._adapt_interval(False)
+
+        if states is not self.data:
+            self.async_set_updated_data(states)
+
+    def _check_push_missed(self, changed_ids, moving):
+        """Leave push mode when a poll finds a change no push reported.
+
+        Outputs with a pending command and covers that were already moving
+        change on their own, so they do not count. A cover that starts
+        moving without a push does.
+        """
+        for output_id in changed_ids:
+            if output_id in self._expected or output_id in moving:
+                continue
+
+            _LOGGER.info(f"Output {output_id} changed without a push, back to normal polling")
+            self.push_active = False
+            return
+
+    # ---------------------------------------------------------
+    # CONNECTION STATE
+    # ---------------------------------------------------------
+    @callback
+    def _connection_state_changed(self, state):
+        if state == STATE_DISCONNECTED and self.last_update_success:
+            # All entities unavailable at once, without waiting for a poll
+            self._drop_expected()
+            self.push_active = False
+            self.async_set_update_error(DomestiaConnectionError("Controller unreachable"))
+        elif state == STATE_CONNECTED and not self.last_update_success:
+            # Back in one step: the next poll makes everything available
+            self.hass.async_create_task(self.async_refresh())
+
+    # ---------------------------------------------------------
+    # COMMAND CONFIRMATION
+    # ---------------------------------------------------------
+    def expect(self, output, hold=0, **state):
+        """Apply optimistic state to an output until a poll confirms it.
+
+        hold is how long the controller needs to get there, e.g. a dimmer
+        transition; polling only speeds up for confirmation after that.
+        """
+        due = time.monotonic() + hold
+        expectation = _Expectation(state, due, due + CONFIRM_TIMEOUT)
+        expectation.apply(output)
+
+        self._expected[output.id] = expectation
+        if not hold:
+            self._set_interval(self._fast_interval())
+
+    def _drop_expected(self):
+        """Forget pending commands and roll their outputs back to the last
+        reported state, so an equal status after a reconnect shows it."""
+        if self.data is not None:
+            for output_id in self._expected:
+                if output_id < len(self.data):
+                    self.outputs[output_id].apply(self.data)
+        self._expected.clear()
+
+    def _check_expected(self, states, changed_ids):
+        now = time.monotonic()
+
+        for output_id, expectation in list(self._expected.items()):
+            if output_id >= len(states):
+                del self._expected[output_id]
+                continue
+
+            output = self.outputs[output_id]
+            output.apply(states)
+
+            if expectation.matches(output):
+                del self._expected[output_id]
+            elif now < expectation.deadline:
+                # Not there yet, keep showing the optimistic state
+                expectation.apply(output)
+                changed_ids.discard(output_id)
+            else:
+                del self._expected[output_id]
+                changed_ids.add(output_id)
+                _LOGGER.debug(f"Output {output_id}: command not confirmed, rolling back")
+
+    # ---------------------------------------------------------
+    # OPTIONS
+    # ---------------------------------------------------------
+    def update_options(self, scan_interval, debug_mode):
+        """Apply changed options to the running coordinator."""
+        self.debug_mode = debug_mode
+        self.idle_interval = scan_interval
+
+        # A shorter idle interval applies at once, a longer one after the
+        # next quiet poll
+        self._set_interval(min(self._interval, scan_interval))
+
+    # ---------------------------------------------------------
+    # ADAPTIVE POLLING
+    # ---------------------------------------------------------
+    # FAST_SCAN_INTERVAL while a cover moves, after a command or a change,
+    # doubling on every quiet poll back to the idle interval. With the cover
+    # model, moving covers are polled every COVER_MODEL_SCAN_INTERVAL.
+    def _adapt_interval(self, changed):
+        moving = any(output.closing or output.opening for output in self.outputs.category("cover"))
+        now = time.monotonic()
+
+        if any(expectation.due <= now for expectation in self._expected.values()):
+            self._set_interval(self._fast_interval())
+        elif moving:
+            if self.cover_model:
+                self._set_interval(min(COVER_MODEL_SCAN_INTERVAL, self.idle_interval))
+            else:
+                self._set_interval(self._fast_interval())
+        elif self.push_active:
+            self._set_interval(max(PUSH_SAFETY_INTERVAL, self.idle_interval))
+        elif changed:
+            self._set_interval(self._fast_interval())
+        else:
+            self._set_interval(min(self._interval * 2, self.idle_interval))
+
+    def _fast_interval(self):
+        """FAST_SCAN_INTERVAL, or longer when the controller answers slowly."""
+        srtt = self.network.flow.srtt
+        if srtt is None:
+            return FAST_SCAN_INTERVAL
+        return max(FAST_SCAN_INTERVAL, round(srtt * FAST_SCAN_RTT_FACTOR, 1))
+
+    def poll_schedule(self):
+        """Current polling state, for diagnostics."""
+        now = time.monotonic()
+        return {
+            "interval": self._interval,
+            "fast_interval": self._fast_interval(),
+            "idle_interval": self.idle_interval,
+            "push_active": self.push_active,
+            "cover_model": self.cover_model,
+            "awaiting_confirmation": sorted(self._expected),
+            "next_thermostat_poll_in": round(max(0, self._climate_due - now), 1)
+            if self._unsub_climate is not None else None,
+        }
+
+    def _set_interval(self, seconds):
+        if seconds != self._interval:
+            self._interval = seconds
+            self.update_interval = timedelta(seconds=seconds)
+            if self.debug_mode:
+                _LOGGER.debug(f"Poll interval now {seconds}s")
+
+    @callback
+    def async_update_listeners(self):
+        """Call only the listeners of outputs that changed."""
+        changed = self.changed_ids
+        self.changed_ids = None
+
+        if changed is None or not self.last_update_success:
+            super().async_update_listeners()
+            return
+
+        self.async_notify_outputs(changed)
+
+    @callback
+    def async_notify_outputs(self, output_ids):
+        """Write the state of the entities of these outputs."""
+        for update_callback, context in list(self._listeners.values()):
+            if context in output_ids:
+                update_callback()
+
+
+class _Expectation:
+    """Optimistic state of one output and when to give up on it."""
+
+    __slots__ = ("state", "due", "deadline")
+
+    def __init__(self, state, due, deadline):
+        self.state = state
+        self.due = due
+        self.deadline = deadline
+
+    def matches(self, output):
+        return all(getattr(output, key) == value for key, value in self.state.items())
+
+    def apply(self, output):
+        for key, value in self.state.items():
+            setattr(output, key, value)
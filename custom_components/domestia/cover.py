@@ -1,11 +1,17 @@
 import logging
+import time
+from datetime import timedelta
 from homeassistant.components.cover import (
     CoverEntity,
     CoverEntityFeature,
     CoverDeviceClass,
 )
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_track_time_interval
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
-from .const import DOMAIN
+from .const import DOMAIN, COVER_UPDATE_INTERVAL
+from .protocol import build_write_output, COVER_MOVE
+from .travel import CoverTravel
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -15,13 +21,12 @@ async def async_setup_entry(hass, entry, add_entities):
     
     data = hass.data[DOMAIN][entry.entry_id]
     network = data["network"]
-    accessories = data["accessories"]
+    outputs = data["outputs"]
     coordinator = data["coordinator"]
 
     covers = [
-        DomestiaCover(coordinator, network, acc)
-        for acc in accessories
-        if acc["category"] == "cover"
+        DomestiaCover(coordinator, network, output)
+        for output in outputs.category("cover")
     ]
 
     _LOGGER.debug(f"Cover: Adding {len(covers)} cover entities")
@@ -31,21 +36,25 @@ async def async_setup_entry(hass, entry, add_entities):
 class DomestiaCover(CoordinatorEntity, CoverEntity):
     """Representation of a Domestia cover/shutter."""
     
-    def __init__(self, coordinator, network, acc):
-        super().__init__(coordinator)
+    def __init__(self, coordinator, network, output):
+        super().__init__(coordinator, context=output.id)
         self.network = network
-        self.acc = acc
+        self.output = output
         self._target_position = 50
+
+        # Optional position estimate between polls
+        self._travel = CoverTravel() if coordinator.cover_model else None
+        self._unsub_travel = None
         
-        _LOGGER.debug(f"Cover: Created entity ID={acc['id']}, Name={acc.get('name')}")
+        _LOGGER.debug(f"Cover: Created entity ID={output.id}, Name={output.name}")
 
     @property
     def name(self):
-        return self.acc.get("name", f"Domestia Cover {self.acc['id']}")
+        return self.output.name or f"Domestia Cover {self.output.id}"
 
     @property
     def unique_id(self):
-        return f"domestia_cover_{self.acc['id']}"
+        return f"domestia_cover_{self.output.id}"
 
     @property
     def device_class(self):
@@ -63,17 +72,11 @@ class DomestiaCover(CoordinatorEntity, CoverEntity):
     @property
     def current_cover_position(self):
         """Return current position (0=closed, 100=open)."""
-        # First try to get from accessory dict (updated by coordinator)
-        if "position" in self.acc:
-            return self.acc["position"]
-        
-        # Fallback to reading from coordinator data
-        if not self.coordinator.data or len(self.coordinator.data) <= self.acc["id"]:
-            return 50
-        
-        # Position is stored in lower 7 bits (0-127, but reported as 0-100)
-        position = self.coordinator.data[self.acc["id"]] % 128
-        return position
+        if self._travel is not None:
+            estimate = self._travel.estimate(time.monotonic())
+            if estimate is not None:
+                return estimate
+        return self.output.position
 
     @property
     def is_closed(self):
@@ -83,68 +86,87 @@ class DomestiaCover(CoordinatorEntity, CoverEntity):
     @property
     def is_closing(self):
         """Return if the cover is closing."""
-        # First check accessory dict
-        if "closing" in self.acc:
-            return self.acc["closing"]
-            
-        if not self.coordinator.data or len(self.coordinator.data) <= self.acc["id"]:
-            return False
-        
         # Bit 7 set on first byte = closing/decreasing
-        return self.coordinator.data[self.acc["id"]] >= 128
+        return self.output.closing
 
     @property
     def is_opening(self):
         """Return if the cover is opening."""
-        # First check accessory dict
-        if "opening" in self.acc:
-            return self.acc["opening"]
-            
-        if not self.coordinator.data or len(self.coordinator.data) <= self.acc["id"] + 1:
-            return False
-        
-        # Bit 7 set on second byte = opening/increasing
-        return self.coordinator.data[self.acc["id"] + 1] >= 128
+        # Bit 7 set on the VOLET_MONTE byte = opening/increasing
+        return self.output.opening
 
     def _handle_coordinator_update(self):
         """Handle updated data from the coordinator."""
         position = self.current_cover_position
         closing = self.is_closing
         opening = self.is_opening
-        _LOGGER.debug(f"Cover {self.acc['id']} '{self.acc.get('name')}': Update received - pos={position}, closing={closing}, opening={opening}")
+        _LOGGER.debug(f"Cover {self.output.id} '{self.output.name}': Update received - pos={position}, closing={closing}, opening={opening}")
+
+        if self._travel is not None:
+            self._travel.observe(self.output.position, closing, opening, time.monotonic())
+            self._track_travel()
+
         self.async_write_ha_state()
 
+    # ---------------------------------------------------------
+    # TRAVEL MODEL
+    # ---------------------------------------------------------
+    def _track_travel(self):
+        """Write estimated positions while the cover moves."""
+        if self._travel.moving and self._travel.speed is not None:
+            if self._unsub_travel is None:
+                self._unsub_travel = async_track_time_interval(
+                    self.hass, self._travel_tick, timedelta(seconds=COVER_UPDATE_INTERVAL)
+                )
+        elif self._unsub_travel is not None:
+            self._unsub_travel()
+            self._unsub_travel = None
+
+    @callback
+    def _travel_tick(self, now):
+        self.async_write_ha_state()
+
+    async def async_will_remove_from_hass(self):
+        if self._unsub_travel is not None:
+            self._unsub_travel()
+            self._unsub_travel = None
+        await super().async_will_remove_from_hass()
+
     async def async_set_cover_position(self, **kwargs):
         """Move the cover to a specific position."""
         position = kwargs.get("position", 50)
         self._target_position = position
+        if self._travel is not None:
+            self._travel.target = position
         
-        _LOGGER.debug(f"Cover {self.acc['id']} '{self.acc.get('name')}': Set position to {position}")
+        _LOGGER.debug(f"Cover {self.output.id} '{self.output.name}': Set position to {position}")
         
         # Send position + 128 as per JS implementation
         # ATWRELAIS command: [255, 0, 0, 3, 150, id+1, position+128]
-        await self.network.send([255, 0, 0, 3, 150, self.acc["id"] + 1, position + 128])
+        await self.coordinator.commands.send(self.output.id, build_write_output(self.output.id, position + COVER_MOVE))
         
-        # Request coordinator refresh
+        # Request coordinator refresh, shared with other commands
+        self.coordinator.expect(self.output)
         await self.coordinator.async_request_refresh()
 
     async def async_open_cover(self, **kwargs):
         """Open the cover."""
-        _LOGGER.debug(f"Cover {self.acc['id']} '{self.acc.get('name')}': OPEN")
+        _LOGGER.debug(f"Cover {self.output.id} '{self.output.name}': OPEN")
         await self.async_set_cover_position(position=100)
 
     async def async_close_cover(self, **kwargs):
         """Close the cover."""
-        _LOGGER.debug(f"Cover {self.acc['id']} '{self.acc.get('name')}': CLOSE")
+        _LOGGER.debug(f"Cover {self.output.id} '{self.output.name}': CLOSE")
         await self.async_set_cover_position(position=0)
 
     async def async_stop_cover(self, **kwargs):
         """Stop the cover."""
-        _LOGGER.debug(f"Cover {self.acc['id']} '{self.acc.get('name')}': STOP")
+        _LOGGER.debug(f"Cover {self.output.id} '{self.output.name}': STOP")
         
         # Send current position to stop (without +128 flag)
         current_pos = self.current_cover_position
-        await self.network.send([255, 0, 0, 3, 150, self.acc["id"] + 1, current_pos])
+        await self.coordinator.commands.send(self.output.id, build_write_output(self.output.id, current_pos))
         
-        # Request coordinator refresh
+        # Request coordinator refresh, shared with other commands
+        self.coordinator.expect(self.output)
         await self.coordinator.async_request_refresh()
@@ -0,0 +1,58 @@
+"""Diagnostics download for a Domestia controller.
+
+Everything comes from what the integration already holds in memory; the
+controller is not queried, so a download works while it is unreachable.
+"""
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+
+TO_REDACT = {"ip", "mac"}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry):
+    data = hass.data[DOMAIN][entry.entry_id]
+    network = data["network"]
+    coordinator = data["coordinator"]
+
+    status = coordinator.data
+
+    return {
+        "entry": {
+            "data": async_redact_data(dict(entry.data), TO_REDACT),
+            "options": dict(entry.options),
+        },
+        "outputs": [
+            {
+                "id": output.id,
+                "type": output.type,
+                "category": output.category,
+                "name": output.name,
+                "partner": output.partner,
+            }
+            for output in data["outputs"]
+        ],
+        "status": {
+            "last_update_success": coordinator.last_update_success,
+            # Status table of the last ATRRELAIS reply or push
+            "atrrelais": bytes(status).hex() if status is not None else None,
+        },
+        "connection": {
+            "state": network.state,
+            "in_flight": network.pending_requests(),
+            "flow": network.flow.as_dict(),
+            "queued": network.queued,
+            "crc_errors": network.crc_errors,
+            "framing_errors": network.framing_errors,
+            "capture_running": network.capture is not None,
+        },
+        "metrics": network.metrics.as_dict(),
+        "polling": {
+            **coordinator.poll_schedule(),
+            "transitions_running": len(coordinator.transitions),
+            "writes_coalesced": coordinator.commands.coalesced,
+        },
+    }
@@ -1,6 +1,10 @@
 import asyncio
-from .protocol import CMD_ATRSTYPE, ATRNOMS
+import logging
+from .network import PRIORITY_DISCOVERY
+from .protocol import CMD_ATRSTYPE, HEADER_SIZE, build_read_name, decode_types, decode_name
+from .state import DomestiaOutput, DomestiaOutputs
 
+_LOGGER = logging.getLogger(__name__)
 
 # Domestia output types
 TOGGLE = 0
@@ -22,97 +26,138 @@ RGB_W = 15
 UNUSED = 255
 
 
+def build_outputs(types):
+    """Output records for a type table, one type per output id."""
+    result = []
+
+    for i, t in enumerate(types):
+        if t in (
+            TOGGLE, RELAIS, TIMER_TOGGLE_MIN, TIMER_TOGGLE_SEC,
+            TIMER_RELANCE_MIN, TIMER_RELANCE_SEC,
+            DIMMER_STOP, DIMMER_CONTINU
+        ):
+            category = "light"
+
+        elif t in (VOLET_DESCENTE, VOLET_UN_BP):
+            category = "cover"
+        
+        elif t == VOLET_MONTE:
+            # VOLET_MONTE (up button) is paired with VOLET_DESCENTE, ignore it
+            category = "ignore"
+
+        elif t == RELAIS_CAPTEUR:
+            category = "climate"
+
+        else:
+            category = "ignore"
+
+        output = DomestiaOutput(i, t, category)
+
+        # The up button of a shutter follows its down button
+        if t == VOLET_DESCENTE and i + 1 < len(types) and types[i + 1] == VOLET_MONTE:
+            output.partner = i + 1
+
+        result.append(output)
+
+    return DomestiaOutputs(result)
+
+
 class DomestiaDiscovery:
-    def __init__(self, network):
+    def __init__(self, network, store=None):
         self.network = network
+        self.store = store
 
     async def load_all(self):
+        """Discover all outputs.
+
+        The CMD_ATRSTYPE reply doubles as a fingerprint of the installation:
+        when it matches the cached type table, the cached names are reused
+        and no name requests are sent.
+        """
         outputs = await self.load_outputs()
-        outputs = await self.load_output_names(outputs)
-        return outputs
 
-    # ---------------------------------------------------------
-    # LOAD TYPES
-    # ---------------------------------------------------------
-    async def load_outputs(self):
-        result = []
+        if self.store is not None:
+            cached = await self.store.async_load()
+            if cached and cached.get("types") == outputs.types:
+                _LOGGER.debug("Output types unchanged, using cached names")
+                for output, name in zip(outputs, cached["names"]):
+                    output.name = name
+                return outputs
 
-        loop = asyncio.get_running_loop()
-        future = loop.create_future()
+        outputs = await self.load_output_names(outputs)
 
-        def cb(data):
-            if not future.done():
-                future.set_result(data)
+        if self.store is not None:
+            await self.store.async_save({
+                "types": outputs.types,
+                "names": outputs.names,
+            })
 
-        await self.network.send(CMD_ATRSTYPE, cb)
-        data = await future
+        return outputs
 
-        if not data or len(data) < 4:
-            return result
+    async def load_cached(self):
+        """Outputs from the discovery cache, without asking the controller.
 
-        count = data[3]
+        Returns None when nothing is cached yet.
+        """
+        if self.store is None:
+            return None
 
-        for i in range(count):
-            t = data[4 + i]
+        cached = await self.store.async_load()
+        if not cached:
+            return None
 
-            if t in (
-                TOGGLE, RELAIS, TIMER_TOGGLE_MIN, TIMER_TOGGLE_SEC,
-                TIMER_RELANCE_MIN, TIMER_RELANCE_SEC,
-                DIMMER_STOP, DIMMER_CONTINU
-            ):
-                category = "light"
+        outputs = build_outputs(cached["types"])
+        for output, name in zip(outputs, cached["names"]):
+            output.name = name
+        return outputs
 
-            elif t in (VOLET_DESCENTE, VOLET_UN_BP):
-                category = "cover"
-            
-            elif t == VOLET_MONTE:
-                # VOLET_MONTE (up button) is paired with VOLET_DESCENTE, ignore it
-                category = "ignore"
+    async def clear_cache(self):
+        if self.store is not None:
+            await self.store.async_remove()
 
-            else:
-                category = "ignore"
+    # ---------------------------------------------------------
+    # LOAD TYPES
+    # ---------------------------------------------------------
+    async def load_outputs(self):
+        data = await self.network.send(CMD_ATRSTYPE, wait_reply=True, priority=PRIORITY_DISCOVERY)
 
-            result.append({
-                "id": i,
-                "type": t,
-                "category": category,
-                "name": None
-            })
+        if not data or len(data) <= HEADER_SIZE:
+            return DomestiaOutputs([])
 
-        return result
+        return build_outputs(decode_types(data))
 
     # ---------------------------------------------------------
     # LOAD NAMES
     # ---------------------------------------------------------
     async def load_output_names(self, outputs):
-        for acc in outputs:
-            if acc["category"] == "ignore":
-                continue
-
-            loop = asyncio.get_running_loop()
-            future = loop.create_future()
-
-            def cb(data):
-                if not future.done():
-                    future.set_result(data)
-
-            # ATRNOMS = 62
-            # Domestia uses 1-based output numbering
-            await self.network.send([255,0,0,2, ATRNOMS, acc["id"] + 1], cb)
-            data = await future
-
-            # decode name
-            try:
-                name = ""
-                for b in data[4:]:
-                    if b == 255:
-                        break
-                    name += chr(b)
-                name = name.strip()
-                if name == "":
-                    name = f"Domestia {acc['id']}"
-                acc["name"] = name
-            except:
-                acc["name"] = f"Domestia {acc['id']}"
-
-        return outputs
\ No newline at end of file
+        """Request all names in one pipelined pass.
+
+        Every request is queued at once; the network's adaptive window
+        decides how many are in flight, and polls, having a higher priority,
+        take the next free slot. Replies are matched to their output by
+        request id, so the order they arrive in does not matter. A missing
+        reply only costs that output its name.
+        """
+        async def load_name(output):
+            output.name = await self._load_name(output.id)
+
+        await asyncio.gather(*(
+            load_name(output) for output in outputs if output.category in ("light", "cover")
+        ))
+
+        return outputs
+
+    async def _load_name(self, output_id):
+        default = f"Domestia {output_id}"
+
+        try:
+            data = await self.network.send(
+                build_read_name(output_id),
+                wait_reply=True,
+                priority=PRIORITY_DISCOVERY,
+            )
+        except asyncio.TimeoutError:
+            _LOGGER.debug(f"No name reply for output {output_id}")
+            return default
+
+        return decode_name(data) or default
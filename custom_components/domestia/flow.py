@@ -0,0 +1,139 @@
+"""Adaptive flow control for one controller connection.
+
+Controllers differ in how much traffic they can take, so the network does
+not use a fixed limit. Round trip times and timeouts of the replies steer
+two things:
+
+- the window, how many requests may await a reply at once. It grows by
+  one request per window of on-time replies and shrinks multiplicatively
+  on a timeout, or when the smoothed round trip time climbs well above the
+  fastest seen (the controller is queueing). At most one decrease per
+  round trip, so one burst of late replies counts once.
+- the send rate, a token bucket refilled at window / round trip time,
+  only while the controller shows overload (a decrease in the last
+  PACING_HOLD seconds). It also paces background writes, which get no
+  reply to measure; user commands are never paced.
+"""
+
+import time
+
+INITIAL_WINDOW = 2  # requests, grows from here on a responsive controller
+WINDOW_DECREASE = 0.5  # factor applied to the window on congestion
+
+# Congestion: the smoothed round trip is this many times the fastest one,
+# and at least QUEUEING_DELAY slower, so LAN jitter does not count
+LATENCY_BACKOFF_FACTOR = 2
+QUEUEING_DELAY = 0.05  # seconds
+
+# Weight of a new sample in the smoothed round trip time
+RTT_GAIN = 1 / 8
+
+# The fastest round trip drifts up this fraction towards slower samples,
+# so a permanently slower line stops counting as congestion
+MIN_RTT_DRIFT = 1 / 256
+
+# Seconds after the last decrease during which frames are paced
+PACING_HOLD = 30
+
+
+class FlowControl:
+    """AIMD request window and token bucket, fed with reply timings."""
+
+    def __init__(self, max_window):
+        self.max_window = max_window
+        self._size = float(min(INITIAL_WINDOW, max_window))
+
+        self.srtt = None  # Smoothed round trip time, seconds
+        self.min_rtt = None
+        self.decreases = 0
+        self._last_decrease = None
+
+        self._tokens = float(max_window)
+        self._refilled = time.monotonic()
+
+    @property
+    def window(self):
+        """Requests that may await a reply at the same time."""
+        return int(self._size)
+
+    @property
+    def rate(self):
+        """Frames per second, None while there is no sign of overload."""
+        if not self.srtt or not self.congested:
+            return None
+        return self._size / self.srtt
+
+    @property
+    def congested(self):
+        """The window was decreased in the last PACING_HOLD seconds."""
+        return self._last_decrease is not None and time.monotonic() - self._last_decrease < PACING_HOLD
+
+    # ---------------------------------------------------------
+    # FEEDBACK
+    # ---------------------------------------------------------
+    def on_reply(self, rtt):
+        if self.srtt is None:
+            self.srtt = self.min_rtt = rtt
+        else:
+            self.srtt += (rtt - self.srtt) * RTT_GAIN
+            if rtt < self.min_rtt:
+                self.min_rtt = rtt
+            else:
+                self.min_rtt += (rtt - self.min_rtt) * MIN_RTT_DRIFT
+
+        if self.srtt > max(self.min_rtt * LATENCY_BACKOFF_FACTOR, self.min_rtt + QUEUEING_DELAY):
+            self._decrease()
+        else:
+            # One request more per window of replies
+            self._size = min(self.max_window, self._size + 1 / self._size)
+
+    def on_timeout(self):
+        self._decrease()
+
+    def _decrease(self):
+        now = time.monotonic()
+        if self.srtt is not None and self._last_decrease is not None and now - self._last_decrease < self.srtt:
+            return
+
+        self._last_decrease = now
+        self._size = max(1.0, self._size * WINDOW_DECREASE)
+        self.decreases += 1
+
+    # ---------------------------------------------------------
+    # PACING
+    # ---------------------------------------------------------
+    def take(self):
+        """Use a token for one frame, False when the bucket is empty."""
+        rate = self.rate
+        if rate is None:
+            self._tokens = float(self.max_window)
+            self._refilled = time.monotonic()
+            return True
+
+        now = time.monotonic()
+        self._tokens = min(self.max_window, self._tokens + (now - self._refilled) * rate)
+        self._refilled = now
+
+        if self._tokens < 1:
+            return False
+
+        self._tokens -= 1
+        return True
+
+    def delay(self):
+        """Seconds until the next token."""
+        rate = self.rate
+        if rate is None or self._tokens >= 1:
+            return 0
+        return (1 - self._tokens) / rate
+
+    def as_dict(self):
+        return {
+            "window": self.window,
+            "max_window": self.max_window,
+            "rate_per_second": round(self.rate, 1) if self.rate else None,
+            "srtt_ms": round(self.srtt * 1000, 2) if self.srtt is not None else None,
+            "min_rtt_ms": round(self.min_rtt * 1000, 2) if self.min_rtt is not None else None,
+            "decreases": self.decreases,
+            "paced": self.congested,
+        }
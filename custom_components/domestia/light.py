@@ -1,10 +1,13 @@
 import logging
 from homeassistant.components.light import (
     LightEntity,
+    LightEntityFeature,
     ColorMode,
 )
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from .const import DOMAIN
+from .discovery import DIMMER_STOP, DIMMER_CONTINU
+from .protocol import build_write_output, DIMMER_MAX_LEVEL, RELAIS_ON
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -14,13 +17,12 @@ async def async_setup_entry(hass, entry, add_entities):
     
     data = hass.data[DOMAIN][entry.entry_id]
     network = data["network"]
-    accessories = data["accessories"]
+    outputs = data["outputs"]
     coordinator = data["coordinator"]
 
     lights = [
-        DomestiaLight(coordinator, network, acc)
-        for acc in accessories
-        if acc["category"] == "light"
+        DomestiaLight(coordinator, network, output)
+        for output in outputs.category("light")
     ]
 
     _LOGGER.debug(f"Light: Adding {len(lights)} entities")
@@ -28,23 +30,22 @@ async def async_setup_entry(hass, entry, add_entities):
 
 
 class DomestiaLight(CoordinatorEntity, LightEntity):
-    def __init__(self, coordinator, network, acc):
-        super().__init__(coordinator)
+    def __init__(self, coordinator, network, output):
+        super().__init__(coordinator, context=output.id)
         self.network = network
-        self.acc = acc
+        self.output = output
 
-        self._brightness = 255
-        self._is_dimmer = acc["type"] in (6, 7)
+        self._is_dimmer = output.type in (DIMMER_STOP, DIMMER_CONTINU)
         
-        _LOGGER.debug(f"Light: Created entity ID={acc['id']}, Name={acc.get('name')}")
+        _LOGGER.debug(f"Light: Created entity ID={output.id}, Name={output.name}")
 
     @property
     def name(self):
-        return self.acc.get("name", f"Domestia Light {self.acc['id']}")
+        return self.output.name or f"Domestia Light {self.output.id}"
 
     @property
     def unique_id(self):
-        return f"domestia_light_{self.acc['id']}"
+        return f"domestia_light_{self.output.id}"
 
     @property
     def supported_color_modes(self):
@@ -52,6 +53,12 @@ class DomestiaLight(CoordinatorEntity, LightEntity):
             return {ColorMode.BRIGHTNESS}
         return {ColorMode.ONOFF}
 
+    @property
+    def supported_features(self):
+        if self._is_dimmer:
+            return LightEntityFeature.TRANSITION
+        return LightEntityFeature(0)
+
     @property
     def color_mode(self):
         if self._is_dimmer:
@@ -60,43 +67,76 @@ class DomestiaLight(CoordinatorEntity, LightEntity):
 
     @property
     def is_on(self):
-        state = self.acc.get("state", False)
-        return state
+        return self.output.is_on
 
     @property
     def brightness(self):
         if self._is_dimmer:
-            return self._brightness
+            return self.output.brightness
         return None
 
     def _handle_coordinator_update(self):
         """Handle updated data from the coordinator."""
-        _LOGGER.debug(f"Light {self.acc['id']}: COORDINATOR UPDATE! state={self.acc.get('state')}")
+        _LOGGER.debug(f"Light {self.output.id}: COORDINATOR UPDATE! state={self.output.is_on}")
         self.async_write_ha_state()
 
     async def async_turn_on(self, **kwargs):
-        _LOGGER.debug(f"Light {self.acc['id']} '{self.acc.get('name')}': TURN ON command")
+        _LOGGER.debug(f"Light {self.output.id} '{self.output.name}': TURN ON command")
         
         if self._is_dimmer:
+            start_level = self._level()
             if "brightness" in kwargs:
-                self._brightness = kwargs["brightness"]
-            value = round(self._brightness * 64 / 255)
-            _LOGGER.debug(f" Sending dimmer command: output={self.acc['id']+1}, value={value}")
-            await self.network.send([255,0,0,3,150, self.acc["id"]+1, value])
+                self.output.brightness = kwargs["brightness"]
+            value = round(self.output.brightness * DIMMER_MAX_LEVEL / 255)
+
+            if kwargs.get("transition"):
+                self._start_fade(start_level, value, kwargs["transition"], is_on=True)
+                return
+
+            self.coordinator.transitions.stop(self.output.id)
+            _LOGGER.debug(f" Sending dimmer command: output={self.output.id+1}, value={value}")
+            await self.coordinator.commands.send(self.output.id, build_write_output(self.output.id, value))
         else:
-            _LOGGER.debug(f" Sending ON command: output={self.acc['id']+1}")
-            await self.network.send([255,0,0,3,150, self.acc["id"]+1, 0xFE])
+            _LOGGER.debug(f" Sending ON command: output={self.output.id+1}")
+            await self.coordinator.commands.send(self.output.id, build_write_output(self.output.id, RELAIS_ON))
 
-        self.acc["state"] = True
+        self.coordinator.expect(self.output, is_on=True)
         self.async_write_ha_state()
         await self.coordinator.async_request_refresh()
 
     async def async_turn_off(self, **kwargs):
-        _LOGGER.debug(f"Light {self.acc['id']} '{self.acc.get('name')}': TURN OFF command")
-        _LOGGER.debug(f" Sending OFF command: output={self.acc['id']+1}")
-        
-        await self.network.send([255,0,0,3,150, self.acc["id"]+1, 0])
+        _LOGGER.debug(f"Light {self.output.id} '{self.output.name}': TURN OFF command")
+
+        if self._is_dimmer:
+            if kwargs.get("transition"):
+                self._start_fade(self._level(), 0, kwargs["transition"], is_on=False)
+                return
+
+            self.coordinator.transitions.stop(self.output.id)
+
+        _LOGGER.debug(f" Sending OFF command: output={self.output.id+1}")
+        await self.coordinator.commands.send(self.output.id, build_write_output(self.output.id, 0))
         
-        self.acc["state"] = False
+        self.coordinator.expect(self.output, is_on=False)
         self.async_write_ha_state()
         await self.coordinator.async_request_refresh()
+
+    # ---------------------------------------------------------
+    # TRANSITIONS
+    # ---------------------------------------------------------
+    def _level(self):
+        """Dimmer level (0-64) the output is at, as far as we know."""
+        if not self.output.is_on:
+            return 0
+        return round(self.output.brightness * DIMMER_MAX_LEVEL / 255)
+
+    def _start_fade(self, start_level, target_level, duration, is_on):
+        _LOGGER.debug(f" Fading output={self.output.id+1} from {start_level} to {target_level} in {duration}s")
+
+        # A level still waiting to be written would land in the middle
+        self.coordinator.commands.cancel(self.output.id)
+        self.coordinator.transitions.start(self.output.id, start_level, target_level, duration)
+
+        # Show the end state now; the poll after the fade confirms it
+        self.coordinator.expect(self.output, hold=duration, is_on=is_on)
+        self.async_write_ha_state()
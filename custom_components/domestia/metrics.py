@@ -0,0 +1,98 @@
+"""Lightweight runtime metrics for one controller connection.
+
+Counters are plain integers and timings go into fixed-bucket histograms,
+so recording costs a few additions on the hot path and no allocations.
+Next to the totals since startup, every histogram keeps a moving average
+and the peak since it was last read, which is what the sensors show.
+"""
+
+# Upper bounds of the histogram buckets, in milliseconds
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Weight of a new sample in the moving average
+RECENT_GAIN = 1 / 8
+
+
+class Histogram:
+    """Count, sum, max and bucket counts of a timing, in milliseconds."""
+
+    __slots__ = ("count", "total", "max", "buckets", "recent", "peak")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.recent = None  # Moving average
+        self.peak = None  # Max since take_peak()
+
+    def record(self, seconds):
+        ms = seconds * 1000
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+        self.recent = ms if self.recent is None else self.recent + (ms - self.recent) * RECENT_GAIN
+        if self.peak is None or ms > self.peak:
+            self.peak = ms
+
+        for i, bound in enumerate(BUCKETS_MS):
+            if ms <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def take_peak(self):
+        """Max since the previous call, None without samples since."""
+        peak = self.peak
+        self.peak = None
+        return peak
+
+    def as_dict(self):
+        labels = [f"le_{bound}" for bound in BUCKETS_MS] + ["inf"]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.mean, 2) if self.count else None,
+            "max_ms": round(self.max, 2),
+            "recent_ms": round(self.recent, 2) if self.recent is not None else None,
+            "buckets": dict(zip(labels, self.buckets)),
+        }
+
+
+class DomestiaMetrics:
+    """Counters and histograms kept by the network and coordinator."""
+
+    def __init__(self):
+        self.rtt = Histogram()
+        self.rtt_by_command = {}
+        self.poll_duration = Histogram()
+        self.timeouts = 0
+        self.reconnects = 0
+        self.push_frames = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def record_rtt(self, command, seconds):
+        self.rtt.record(seconds)
+
+        histogram = self.rtt_by_command.get(command)
+        if histogram is None:
+            histogram = self.rtt_by_command[command] = Histogram()
+        histogram.record(seconds)
+
+    def as_dict(self):
+        return {
+            "rtt": self.rtt.as_dict(),
+            "rtt_by_command": {str(c): h.as_dict() for c, h in self.rtt_by_command.items()},
+            "poll_duration": self.poll_duration.as_dict(),
+            "timeouts": self.timeouts,
+            "reconnects": self.reconnects,
+            "push_frames": self.push_frames,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+        }
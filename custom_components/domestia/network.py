@@ -1,108 +1,573 @@
 import asyncio
-from .protocol import build_crc
-from .const import PORT_TCP
+import heapq
+import itertools
+import logging
+import random
+import socket
+import time
+from .flow import FlowControl
+from .capture import WireCapture, DEFAULT_CAPTURE_SIZE, TX, RX
+from .metrics import DomestiaMetrics
+from .protocol import FrameDecoder, CMD_ATRRELAIS, CMD_ATTEMP, CMD_ATRTEMPSTATUS
+from .const import PORT_TCP, DEFAULT_REQUEST_TIMEOUT, DEFAULT_MAX_IN_FLIGHT
+
+_LOGGER = logging.getLogger(__name__)
+
+# Connection states
+STATE_DISCONNECTED = "disconnected"
+STATE_CONNECTING = "connecting"
+STATE_CONNECTED = "connected"
+STATE_CLOSED = "closed"
+
+# Reconnect backoff, doubled per failed attempt with +-20% jitter
+RECONNECT_MIN_DELAY = 1  # seconds
+RECONNECT_MAX_DELAY = 60  # seconds
+CONNECT_TIMEOUT = 10  # seconds
+
+# TCP keepalive, so a dead controller is noticed while the line is idle
+KEEPALIVE_IDLE = 30  # seconds before the first probe
+KEEPALIVE_INTERVAL = 10  # seconds between probes
+KEEPALIVE_COUNT = 3  # unanswered probes before the connection drops
+
+# Request ids are a single byte; 255 is the frame start byte
+REQUEST_ID_COUNT = 255
+
+# Outbound priorities, lowest value goes first
+PRIORITY_COMMAND = 0    # User commands
+PRIORITY_CONFIRM = 1    # Polls confirming a command
+PRIORITY_POLL = 2       # Routine polls
+PRIORITY_DISCOVERY = 3  # Discovery traffic
+
+
+class DomestiaConnectionError(Exception):
+    """The connection to the controller is down."""
+
+
+class _PendingRequest:
+    """A request waiting for its reply."""
+
+    __slots__ = ("future", "timer", "command", "sent_at")
+
+    def __init__(self, future, timer, command, sent_at):
+        self.future = future
+        self.timer = timer
+        self.command = command
+        self.sent_at = sent_at
+
+
+def _consume_exception(future):
+    """Mark a reply error as seen when every caller already left."""
+    if not future.cancelled():
+        future.exception()
+
+
+class _Outgoing:
+    """A request waiting in the outbound queue."""
+
+    __slots__ = ("request", "priority", "wait_reply", "timeout", "future", "key", "sent")
+
+    def __init__(self, request, priority, wait_reply, timeout, future, key):
+        self.request = request
+        self.priority = priority
+        self.wait_reply = wait_reply
+        self.timeout = timeout
+        self.future = future
+        self.key = key
+        self.sent = False
+
+
+class _DomestiaProtocol(asyncio.Protocol):
+    """Transport callbacks of one connection, handed to DomestiaNetwork.
+
+    Received data is decoded straight from data_received, so an idle line
+    costs no wakeups at all.
+    """
+
+    def __init__(self, network):
+        self.network = network
+        self.transport = None
+        self.closed = asyncio.get_running_loop().create_future()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        _configure_socket(transport.get_extra_info("socket"))
+
+    def data_received(self, data):
+        self.network._data_received(data)
+
+    def connection_lost(self, exc):
+        if not self.closed.done():
+            self.closed.set_result(exc)
+        self.network._write_ready.set()
+
+    def pause_writing(self):
+        self.network._write_ready.clear()
+
+    def resume_writing(self):
+        self.network._write_ready.set()
+
+
+def _configure_socket(sock):
+    """No Nagle delay for small frames, keepalive for idle lines."""
+    if sock is None:
+        return
+
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        for option, value in (
+            ("TCP_KEEPIDLE", KEEPALIVE_IDLE),
+            ("TCP_KEEPINTVL", KEEPALIVE_INTERVAL),
+            ("TCP_KEEPCNT", KEEPALIVE_COUNT),
+        ):
+            # Not available on every platform
+            if hasattr(socket, option):
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+    except OSError as e:
+        _LOGGER.debug(f"Could not set socket options: {e}")
 
 
 class DomestiaNetwork:
-    def __init__(self, ip, mac):
+    def __init__(self, ip, mac, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
         self.ip = ip
         self.mac = mac.upper().replace("-", ":")
-        self.reader = None
-        self.writer = None
+        self.transport = None
+        self._protocol = None
+        # Cleared while the transport's write buffer is full
+        self._write_ready = asyncio.Event()
+        self._write_ready.set()
 
         self.request_id = 0
-        self.callbacks = {}
-        self._connected = False
+        # Window, up to max_in_flight, and send rate follow the measured
+        # round trips
+        self.flow = FlowControl(max_in_flight)
+        self._pending = {}
+        self._decoder = FrameDecoder()
+        self.metrics = DomestiaMetrics()
+
+        # Raw traffic ring buffer, only while a capture runs
+        self.capture = None
+
+        # Status frames the controller sends on its own (wall buttons)
+        self._push_listeners = []
+        self._status_size = None  # Frame size of the last ATRRELAIS reply
+        self._expired_ids = set()  # A late reply to these is not a push
+
+        self.state = STATE_DISCONNECTED
+        self._state_listeners = []
+        self._connected_event = asyncio.Event()
+        self._connection_task = None
+
+        # Outbound queue: heap of (priority, sequence, _Outgoing)
+        self._queue = []
+        self._sequence = itertools.count()
+        # Set on a newly queued request or a freed window slot
+        self._wake_writer = asyncio.Event()
+        self._queued_polls = {}
+        self._write_task = None
 
     # ---------------------------------------------------------
     # CONNECTIE
     # ---------------------------------------------------------
-    async def connect(self):
-        await self._open_connection()
-        asyncio.create_task(self._listen_loop())
+    async def connect(self, wait=True):
+        """Connect and start the background loops.
 
-    async def _open_connection(self):
-        self.reader, self.writer = await asyncio.open_connection(self.ip, PORT_TCP)
-        self._connected = True
+        Without wait the first attempt runs in the background too, and the
+        connection loop keeps retrying until the controller answers.
+        """
+        if wait:
+            await self._open_connection()
+        self._connection_task = asyncio.create_task(self._connection_loop())
+        self._write_task = asyncio.create_task(self._write_loop())
+
+    async def wait_connected(self):
+        await self._connected_event.wait()
+
+    async def disconnect(self):
+        """Close the connection for good and stop the background tasks."""
+        self._set_state(STATE_CLOSED)
+        for task in (self._connection_task, self._write_task):
+            if task is not None:
+                task.cancel()
+        self._close_transport()
+        self._fail_pending(DomestiaConnectionError("Connection closed"))
 
-    async def _reconnect(self):
-        self._connected = False
+    def add_state_listener(self, listener):
+        """Call listener(state) on every connection state change."""
+        self._state_listeners.append(listener)
+        return lambda: self._state_listeners.remove(listener)
+
+    def add_push_listener(self, listener):
+        """Call listener(frame) for every unsolicited status frame."""
+        self._push_listeners.append(listener)
+        return lambda: self._push_listeners.remove(listener)
+
+    def _set_state(self, state):
+        if state == self.state or self.state == STATE_CLOSED:
+            return
+
+        self.state = state
+        if state == STATE_CONNECTED:
+            self._connected_event.set()
+        else:
+            self._connected_event.clear()
+
+        for listener in list(self._state_listeners):
+            listener(state)
+
+    async def _open_connection(self):
+        self._set_state(STATE_CONNECTING)
         try:
-            if self.writer:
-                self.writer.close()
-        except:
-            pass
+            loop = asyncio.get_running_loop()
+            self.transport, self._protocol = await asyncio.wait_for(
+                loop.create_connection(lambda: _DomestiaProtocol(self), self.ip, PORT_TCP),
+                timeout=CONNECT_TIMEOUT,
+            )
+        except (OSError, asyncio.TimeoutError):
+            self._set_state(STATE_DISCONNECTED)
+            raise
+
+        self._decoder.reset()
+        self._write_ready.set()
+        self._set_state(STATE_CONNECTED)
+
+    def _close_transport(self):
+        if self.transport is not None:
+            self.transport.close()
+
+    async def _connection_loop(self):
+        """Read while connected, reconnect with backoff when the line drops."""
+        attempt = 0
+        # Not connected by connect(): the first attempt goes out at once
+        connected_before = self.state == STATE_CONNECTED
+        first = not connected_before
+
+        while self.state != STATE_CLOSED:
+            if self.state != STATE_CONNECTED:
+                if not first:
+                    delay = min(RECONNECT_MAX_DELAY, RECONNECT_MIN_DELAY * 2 ** attempt)
+                    await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+
+                try:
+                    await self._open_connection()
+                except (OSError, asyncio.TimeoutError) as e:
+                    attempt += 1
+                    _LOGGER.debug(f"Reconnect to {self.ip} failed (attempt {attempt}): {e}")
+                    first = False
+                    continue
+
+                if connected_before:
+                    _LOGGER.info(f"Reconnected to {self.ip}")
+                    self.metrics.reconnects += 1
+                else:
+                    _LOGGER.info(f"Connected to {self.ip}")
+                    connected_before = True
+                first = False
+                attempt = 0
+
+            # Wait until the transport reports the connection gone
+            await self._protocol.closed
+            self._connection_lost("Connection to the controller lost")
+
+    def _connection_lost(self, reason):
+        """Drop the connection and fail everything that waits on it."""
+        if self.state != STATE_CONNECTED:
+            return
+
+        _LOGGER.warning(f"{reason} ({self.ip})")
+        self._set_state(STATE_DISCONNECTED)
+        self._close_transport()
+        self._fail_pending(DomestiaConnectionError(reason))
+
+    def _fail_pending(self, error):
+        for pending in self._pending.values():
+            pending.timer.cancel()
+            if not pending.future.done():
+                pending.future.set_exception(error)
+        self._pending.clear()
+
+        for _, _, entry in self._queue:
+            if not entry.future.done():
+                entry.future.set_exception(error)
+        self._queue.clear()
+        self._queued_polls.clear()
+
+        # Let the writer re-check its window
+        self._wake_writer.set()
 
-        await asyncio.sleep(1)
-        await self._open_connection()
+    # ---------------------------------------------------------
+    # RECEIVING
+    # ---------------------------------------------------------
+    def _data_received(self, data):
+        self.metrics.bytes_received += len(data)
+        if self.capture is not None:
+            self.capture.record(RX, data)
+        for req_id, frame in self._decoder.feed(data):
+            self._handle_incoming(req_id, frame)
 
     # ---------------------------------------------------------
-    # LISTENER LOOP
+    # REPLY HANDLING
     # ---------------------------------------------------------
-    async def _listen_loop(self):
-        """Continuously read data from Domestia without blocking HA."""
+    def _handle_incoming(self, req_id, frame):
+        pending = self._pending.get(req_id)
+
+        if pending is None:
+            self._handle_unsolicited(req_id, frame)
+            return
+
+        if pending.command == CMD_ATRRELAIS.command:
+            self._status_size = len(frame)
+
+        if not pending.future.done():
+            pending.future.set_result(frame)
+        rtt = time.monotonic() - pending.sent_at
+        self.metrics.record_rtt(pending.command, rtt)
+        self.flow.on_reply(rtt)
+        self._release(req_id, pending.future)
+
+    def _handle_unsolicited(self, req_id, frame):
+        """A frame nobody asked for: a status push, or a late reply."""
+        if req_id in self._expired_ids:
+            self._expired_ids.discard(req_id)
+            return
+
+        # Pushes carry no command byte; they are recognised by having the
+        # size of the status table
+        if len(frame) != self._status_size:
+            return
+
+        self.metrics.push_frames += 1
+        for listener in list(self._push_listeners):
+            listener(frame)
+
+    def _expire(self, req_id, future):
+        """Deadline passed: fail the waiter and free its request id."""
+        if not future.done():
+            future.set_exception(asyncio.TimeoutError())
+        self.metrics.timeouts += 1
+        self.flow.on_timeout()
+        self._expired_ids.add(req_id)
+        self._release(req_id, future)
+
+    def _release(self, req_id, future):
+        pending = self._pending.get(req_id)
+        if pending is None or pending.future is not future:
+            return
+
+        del self._pending[req_id]
+        pending.timer.cancel()
+        self._wake_writer.set()
+
+    def _next_request_id(self):
+        """Next request id that is not still waiting for a reply."""
+        req_id = self.request_id
+        for _ in range(REQUEST_ID_COUNT):
+            req_id = (req_id + 1) % REQUEST_ID_COUNT
+            if req_id not in self._pending:
+                break
+
+        self.request_id = req_id
+        return req_id
+
+    # ---------------------------------------------------------
+    # SEND COMMAND
+    # ---------------------------------------------------------
+    async def send(
+        self,
+        request,
+        wait_reply=False,
+        timeout=DEFAULT_REQUEST_TIMEOUT,
+        priority=PRIORITY_COMMAND,
+    ):
+        """Queue a request (see protocol.Request) for Domestia.
+
+        Frames go out by priority, so a user command never waits behind
+        polls or discovery. With wait_reply the controller's reply frame is
+        returned, or asyncio.TimeoutError is raised once the deadline
+        passes. How many of these requests run at the same time, and how
+        fast frames go out, adapts to the controller's round trip times.
+        While the controller is unreachable DomestiaConnectionError is
+        raised straight away.
+        """
+        if self.state != STATE_CONNECTED:
+            raise DomestiaConnectionError(f"Not connected to {self.ip}")
+
+        entry = self._enqueue(request, wait_reply, timeout, priority)
+
+        if not wait_reply:
+            return None
+
+        # Shielded: a superseded poll is shared by several callers
+        return await asyncio.shield(entry.future)
+
+    def _enqueue(self, request, wait_reply, timeout, priority):
+        key = None
+        if wait_reply and priority >= PRIORITY_CONFIRM:
+            # A newer poll supersedes the same poll still in the queue
+            key = request.payload
+            queued = self._queued_polls.get(key)
+            if queued is not None:
+                if priority < queued.priority:
+                    queued.priority = priority
+                    heapq.heappush(self._queue, (priority, next(self._sequence), queued))
+                return queued
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume_exception)
+        entry = _Outgoing(request, priority, wait_reply, timeout, future, key)
+
+        if key is not None:
+            self._queued_polls[key] = entry
+
+        heapq.heappush(self._queue, (priority, next(self._sequence), entry))
+        self._wake_writer.set()
+        return entry
+
+    async def _write_loop(self):
+        """Write queued frames in priority order.
+
+        Everything that can go out is collected first and handed to the
+        transport in one call, so a burst queued in one event loop tick
+        costs a single write.
+        """
         while True:
-            try:
-                # Timeout so HA can shut down cleanly
-                data = await asyncio.wait_for(self.reader.read(1024), timeout=5)
+            if self.state != STATE_CONNECTED:
+                await self._connected_event.wait()
+                continue
 
-                # Empty read = Domestia closed connection
-                if not data:
-                    await self._reconnect()
-                    continue
+            if not self._write_ready.is_set():
+                await self._write_ready.wait()
+                continue
 
-                self._handle_incoming(list(data))
+            # Cleared before looking, so nothing queued meanwhile is missed
+            self._wake_writer.clear()
+            frames = self._take_frames()
+
+            if frames:
+                try:
+                    self.transport.writelines(frames)
+                except Exception as e:
+                    self._connection_lost(f"Write failed: {e}")
+                continue
 
+            # Nothing can go out: wait for a new request, a free slot in
+            # the window or, when paced, the next token
+            delay = self.flow.delay() if self._queue else None
+            try:
+                await asyncio.wait_for(self._wake_writer.wait(), timeout=delay or None)
             except asyncio.TimeoutError:
-                # No data received → normal, Domestia only replies on request
+                pass
+
+    def _take_frames(self):
+        """Pop and encode every queued request that may go out now.
+
+        While the window is full, requests that wait for a reply stay
+        queued, but writes behind them that need none still go out. While
+        the controller is overloaded, everything but user commands is
+        paced.
+        """
+        frames = []
+        held = []
+
+        while self._queue:
+            item = heapq.heappop(self._queue)
+            entry = item[2]
+            if entry.sent:
+                # Stale heap slot of a poll that was moved up
                 continue
 
-            except Exception:
-                # Any other error → reconnect
-                await self._reconnect()
+            if entry.wait_reply and len(self._pending) >= self.flow.window:
+                held.append(item)
+                continue
+
+            # User commands are never paced
+            if entry.priority != PRIORITY_COMMAND and not self.flow.take():
+                held.append(item)
+                continue
+
+            entry.sent = True
+            if entry.key is not None:
+                self._queued_polls.pop(entry.key, None)
+
+            frames.append(self._encode(entry))
+
+        for item in held:
+            heapq.heappush(self._queue, item)
+
+        return frames
+
+    def _encode(self, entry):
+        req_id = self._next_request_id()
+        self._expired_ids.discard(req_id)
+
+        if entry.wait_reply:
+            loop = asyncio.get_running_loop()
+            timer = loop.call_later(entry.timeout, self._expire, req_id, entry.future)
+            self._pending[req_id] = _PendingRequest(entry.future, timer, entry.request.command, time.monotonic())
+        elif not entry.future.done():
+            entry.future.set_result(None)
+
+        frame = entry.request.encode(req_id)
+        self.metrics.bytes_sent += len(frame)
+        if self.capture is not None:
+            self.capture.record(TX, frame)
+        return frame
 
     # ---------------------------------------------------------
-    # CALLBACK HANDLING
+    # WIRE CAPTURE
     # ---------------------------------------------------------
-    def _handle_incoming(self, data):
-        if len(data) == 0:
-            return
-
-        req_id = data[-1]
-        callback = self.callbacks.pop(req_id, None)
+    def start_capture(self, max_frames=DEFAULT_CAPTURE_SIZE):
+        """Record raw traffic into a new ring buffer."""
+        self.capture = WireCapture(max_frames)
+        return self.capture
 
-        if callback:
-            payload = data[:-1]
-            result = callback(payload)
-            if asyncio.iscoroutine(result):
-                asyncio.create_task(result)
+    def stop_capture(self):
+        capture = self.capture
+        self.capture = None
+        return capture
 
     # ---------------------------------------------------------
-    # SEND COMMAND
+    # STATISTICS
     # ---------------------------------------------------------
-    async def send(self, values, callback=None):
-        if not self._connected:
-            await self._reconnect()
+    @property
+    def in_flight(self):
+        """Requests waiting for a reply."""
+        return len(self._pending)
 
-        self.request_id = (self.request_id + 1) % 255
+    @property
+    def queued(self):
+        """Frames waiting to be written."""
+        return len(self._queue)
 
-        if callback:
-            self.callbacks[self.request_id] = callback
+    @property
+    def crc_errors(self):
+        return self._decoder.crc_errors
 
-        frame = values.copy()
-        crc = build_crc(frame)
-        frame.append(crc)
-        frame.append(self.request_id)
+    @property
+    def framing_errors(self):
+        """Bytes skipped while looking for a frame start."""
+        return self._decoder.dropped_bytes
 
-        try:
-            self.writer.write(bytes(frame))
-            await self.writer.drain()
-        except Exception:
-            await self._reconnect()
+    def pending_requests(self):
+        """Request id, command and age of every request awaiting a reply."""
+        now = time.monotonic()
+        return [
+            {"id": req_id, "command": pending.command, "age_ms": round((now - pending.sent_at) * 1000, 1)}
+            for req_id, pending in self._pending.items()
+        ]
 
     # ---------------------------------------------------------
     # READ RELAY STATUS
     # ---------------------------------------------------------
-    async def read_relais_status(self, callback):
-        frame = [255,0,0,1,156]  # ATRRELAIS
-        await self.send(frame, callback)
\ No newline at end of file
+    async def read_relais_status(self, timeout=DEFAULT_REQUEST_TIMEOUT, priority=PRIORITY_POLL):
+        return await self.send(CMD_ATRRELAIS, wait_reply=True, timeout=timeout, priority=priority)
+
+    # ---------------------------------------------------------
+    # READ THERMOSTATS
+    # ---------------------------------------------------------
+    async def read_thermostats(self, timeout=DEFAULT_REQUEST_TIMEOUT, priority=PRIORITY_POLL):
+        """Temperatures and setpoint/mode tables, requested back to back."""
+        return await asyncio.gather(
+            self.send(CMD_ATTEMP, wait_reply=True, timeout=timeout, priority=priority),
+            self.send(CMD_ATRTEMPSTATUS, wait_reply=True, timeout=timeout, priority=priority),
+        )
@@ -1,21 +1,221 @@
-# Domestia protocol constants
+# Domestia protocol constants and codec
 
-# Commands
-CMD_ATMAC = [255,0,0,1,0x8A]
-CMD_ATRSTYPE = [255,0,0,1,66]
-CMD_ATTEMP = [255,0,0,1,29]
-CMD_ATRTEMPSTATUS = [255,0,0,1,59]
-CMD_ATRRELAIS = [255,0,0,1,156]
+# Command bytes
+ATTEMP = 29
+ATRTEMPSTATUS = 59
+ATRSTYPE = 66
+ATMAC = 0x8A
+ATRRELAIS = 156
 
 # Name requests
 ATRNOMS = 62     # Output name
 ATRNOMC = 80     # Cover name (voor later)
 
+# Output writes: [255,0,0,3, ATWRELAIS, id+1, value]
+ATWRELAIS = 150
+RELAIS_ON = 0xFE       # Relay on
+DIMMER_MAX_LEVEL = 64  # Dimmer levels run 0-64
+COVER_MOVE = 128       # Added to a cover position to move there
+
+# Thermostat writes: [255,0,0,3, command, id+1, value]
+ATWTEMPMODE = 58       # Setpoint, in half degrees
+ATWCAPTEURMODE = 85    # Mode
+CHAUD_AUTO = 0
+CHAUD_VEROUILLE = 2    # Heating locked, i.e. off
+
+# Frame layout: 255, len (3 bytes, big endian), payload[len], crc, request id
+FRAME_START = 255
+HEADER_SIZE = 4
+TRAILER_SIZE = 2
+MAX_PAYLOAD_SIZE = 1024
+NAME_END = 0xFF
+
+
 def build_crc(values):
     """Compute Domestia CRC."""
     return sum(values[4:]) % 256
 
 
+# ---------------------------------------------------------
+# REQUESTS
+# ---------------------------------------------------------
+class Request:
+    """One encoded request, ready to be sent with any request id.
+
+    The whole frame, CRC included, is built once. Sending only stamps the
+    request id into the template and takes one immutable copy for the
+    transport, so the shared poll requests below cost one allocation each.
+    """
+
+    __slots__ = ("command", "payload", "_frame")
+
+    def __init__(self, command, *args):
+        self.command = command
+        self.payload = bytes((command, *args))
+
+        frame = bytearray((FRAME_START,))
+        frame += len(self.payload).to_bytes(3, "big")
+        frame += self.payload
+        frame.append(sum(self.payload) % 256)
+        frame.append(0)
+        self._frame = frame
+
+    def encode(self, request_id):
+        frame = self._frame
+        frame[-1] = request_id
+        return bytes(frame)
+
+    def __len__(self):
+        return len(self._frame)
+
+    def __repr__(self):
+        return f"Request({', '.join(str(b) for b in self.payload)})"
+
+
+# Requests without arguments are shared
+CMD_ATMAC = Request(ATMAC)
+CMD_ATRSTYPE = Request(ATRSTYPE)
+CMD_ATTEMP = Request(ATTEMP)
+CMD_ATRTEMPSTATUS = Request(ATRTEMPSTATUS)
+CMD_ATRRELAIS = Request(ATRRELAIS)
+
+
+def build_read_name(output_id):
+    """ATRNOMS request; Domestia uses 1-based output numbering."""
+    return Request(ATRNOMS, output_id + 1)
+
+
+def build_write_output(output_id, value):
+    """ATWRELAIS request; Domestia uses 1-based output numbering."""
+    return Request(ATWRELAIS, output_id + 1, value)
+
+
+def build_write_setpoint(output_id, temperature):
+    """ATWTEMPMODE request; Domestia expects the temperature * 2."""
+    return Request(ATWTEMPMODE, output_id + 1, round(temperature * 2))
+
+
+def build_write_mode(output_id, mode):
+    """ATWCAPTEURMODE request."""
+    return Request(ATWCAPTEURMODE, output_id + 1, mode)
+
+
+# ---------------------------------------------------------
+# REPLIES
+# ---------------------------------------------------------
+# Reply frames come from FrameDecoder without their request id. The
+# decoders return memoryviews into the frame, so nothing is copied.
+def decode_payload(frame):
+    return memoryview(frame)[HEADER_SIZE:-1]
+
+
+def decode_status_table(frame):
+    """ATRRELAIS status bytes, indexed by output id.
+
+    Starts one byte before the payload, as the original JS client does
+    with message.slice(3): output n reads payload byte n - 1.
+    """
+    return memoryview(frame)[HEADER_SIZE - 1:-1]
+
+
+def decode_types(frame):
+    """ATRSTYPE reply: one type byte per output."""
+    return decode_payload(frame)
+
+
+def decode_name(frame):
+    """ATRNOMS reply: latin-1 text up to the first 0xFF."""
+    end = frame.find(NAME_END, HEADER_SIZE, len(frame) - 1)
+    if end == -1:
+        end = len(frame) - 1
+    return str(memoryview(frame)[HEADER_SIZE:end], "latin-1").strip()
+
+
+def decode_temperatures(frame):
+    """ATTEMP reply: one byte per output, in half degrees."""
+    return decode_payload(frame)
+
+
+def decode_thermostat_status(frame):
+    """ATRTEMPSTATUS reply: setpoint (half degrees) and mode per output."""
+    return decode_payload(frame)
+
+
+# ---------------------------------------------------------
+# STREAM DECODING
+# ---------------------------------------------------------
+class FrameDecoder:
+    """Incremental decoder for the Domestia TCP stream.
+
+    TCP does not preserve message boundaries: one read can hold several
+    replies, or only part of a long one (ATRRELAIS on a full controller).
+    Bytes are collected in a reusable buffer and every complete frame is
+    handed out as (request_id, frame), where frame is the reply without its
+    request id trailer - the same shape callers always received. Headers
+    and CRCs are checked through a memoryview; each frame is copied once.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.crc_errors = 0
+        self.dropped_bytes = 0
+
+    def feed(self, data):
+        """Add received bytes and return all complete frames."""
+        buf = self._buffer
+        buf += data
+
+        frames = []
+        pos = 0
+        size = len(buf)
+
+        # Released before the buffer is compacted below
+        with memoryview(buf) as view:
+            while pos < size:
+                # Resync on the start byte
+                if buf[pos] != FRAME_START:
+                    start = buf.find(FRAME_START, pos)
+                    if start == -1:
+                        self.dropped_bytes += size - pos
+                        pos = size
+                        break
+                    self.dropped_bytes += start - pos
+                    pos = start
+
+                if size - pos < HEADER_SIZE:
+                    break
+
+                length = int.from_bytes(view[pos + 1:pos + HEADER_SIZE], "big")
+                if length > MAX_PAYLOAD_SIZE:
+                    # Not a real header, skip the start byte
+                    self.dropped_bytes += 1
+                    pos += 1
+                    continue
+
+                end = pos + HEADER_SIZE + length + TRAILER_SIZE
+                if end > size:
+                    break
+
+                crc_pos = end - TRAILER_SIZE
+                if sum(view[pos + HEADER_SIZE:crc_pos]) % 256 != buf[crc_pos]:
+                    self.crc_errors += 1
+                    self.dropped_bytes += 1
+                    pos += 1
+                    continue
+
+                frames.append((buf[end - 1], bytes(view[pos:end - 1])))
+                pos = end
+
+        if pos:
+            del buf[:pos]
+
+        return frames
+
+    def reset(self):
+        """Drop any partial frame, e.g. after a reconnect."""
+        self._buffer.clear()
+
+
 __all__ = [
     "CMD_ATMAC",
     "CMD_ATRSTYPE",
@@ -24,5 +224,25 @@ __all__ = [
     "CMD_ATRRELAIS",
     "ATRNOMS",
     "ATRNOMC",
+    "ATWRELAIS",
+    "RELAIS_ON",
+    "DIMMER_MAX_LEVEL",
+    "COVER_MOVE",
+    "ATWTEMPMODE",
+    "ATWCAPTEURMODE",
+    "CHAUD_AUTO",
+    "CHAUD_VEROUILLE",
     "build_crc",
-]
\ No newline at end of file
+    "Request",
+    "build_read_name",
+    "build_write_output",
+    "build_write_setpoint",
+    "build_write_mode",
+    "decode_payload",
+    "decode_status_table",
+    "decode_types",
+    "decode_name",
+    "decode_temperatures",
+    "decode_thermostat_status",
+    "FrameDecoder",
+]
@@ -0,0 +1,85 @@
+import logging
+from datetime import timedelta
+
+from homeassistant.components.sensor import SensorEntity, SensorStateClass
+from homeassistant.const import EntityCategory, UnitOfInformation, UnitOfTime
+from homeassistant.helpers.device_registry import DeviceInfo
+from .const import DOMAIN
+from .protocol import ATRRELAIS, ATRNOMS, ATTEMP
+
+_LOGGER = logging.getLogger(__name__)
+
+# Metrics are read from memory, a slow refresh is enough
+SCAN_INTERVAL = timedelta(seconds=30)
+
+MEASUREMENT = SensorStateClass.MEASUREMENT
+TOTAL = SensorStateClass.TOTAL_INCREASING
+
+# key, name, unit, state class, value. Timings are moving averages, and
+# the max is the peak since the previous update, so they follow the load
+METRIC_SENSORS = (
+    ("rtt_mean", "Round trip time", UnitOfTime.MILLISECONDS, MEASUREMENT,
+     lambda n: _round(n.metrics.rtt.recent)),
+    ("rtt_max", "Round trip time max", UnitOfTime.MILLISECONDS, MEASUREMENT,
+     lambda n: _round(n.metrics.rtt.take_peak())),
+    ("rtt_poll", "Poll round trip time", UnitOfTime.MILLISECONDS, MEASUREMENT,
+     lambda n: _command_rtt(n, ATRRELAIS)),
+    ("rtt_thermostat", "Thermostat round trip time", UnitOfTime.MILLISECONDS, MEASUREMENT,
+     lambda n: _command_rtt(n, ATTEMP)),
+    ("rtt_name", "Name read round trip time", UnitOfTime.MILLISECONDS, MEASUREMENT,
+     lambda n: _command_rtt(n, ATRNOMS)),
+    ("poll_duration", "Poll duration", UnitOfTime.MILLISECONDS, MEASUREMENT,
+     lambda n: _round(n.metrics.poll_duration.recent)),
+    ("timeouts", "Timeouts", None, TOTAL, lambda n: n.metrics.timeouts),
+    ("crc_errors", "CRC errors", None, TOTAL, lambda n: n.crc_errors),
+    ("framing_errors", "Framing errors", None, TOTAL, lambda n: n.framing_errors),
+    ("reconnects", "Reconnects", None, TOTAL, lambda n: n.metrics.reconnects),
+    ("push_frames", "Pushed status frames", None, TOTAL, lambda n: n.metrics.push_frames),
+    ("in_flight", "Requests in flight", None, MEASUREMENT, lambda n: n.in_flight),
+    ("window", "Request window", None, MEASUREMENT, lambda n: n.flow.window),
+    ("queued", "Queued frames", None, MEASUREMENT, lambda n: n.queued),
+    ("bytes_sent", "Bytes sent", UnitOfInformation.BYTES, TOTAL, lambda n: n.metrics.bytes_sent),
+    ("bytes_received", "Bytes received", UnitOfInformation.BYTES, TOTAL, lambda n: n.metrics.bytes_received),
+)
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+def _command_rtt(network, command):
+    histogram = network.metrics.rtt_by_command.get(command)
+    return _round(histogram.recent) if histogram is not None else None
+
+
+async def async_setup_entry(hass, entry, add_entities):
+    _LOGGER.debug("Domestia Sensor: async_setup_entry called")
+
+    network = hass.data[DOMAIN][entry.entry_id]["network"]
+
+    add_entities([DomestiaMetricSensor(network, *metric) for metric in METRIC_SENSORS])
+
+
+class DomestiaMetricSensor(SensorEntity):
+    """One runtime metric of the controller connection."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(self, network, key, name, unit, state_class, value):
+        self.network = network
+        self._value = value
+
+        self._attr_name = f"Domestia {name}"
+        self._attr_unique_id = f"domestia_{network.mac}_{key}"
+        self._attr_native_unit_of_measurement = unit
+        self._attr_state_class = state_class
+        self._attr_device_info = DeviceInfo(
+            identifiers={(DOMAIN, network.mac)},
+            name="Domestia controller",
+            manufacturer="Domestia",
+        )
+
+    async def async_update(self):
+        # Read once per update: the peak resets when it is read
+        self._attr_native_value = self._value(self.network)
@@ -0,0 +1,159 @@
+import logging
+import time
+
+import voluptuous as vol
+from homeassistant.core import HomeAssistant, ServiceCall
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers import entity_registry as er
+
+from .capture import DEFAULT_CAPTURE_SIZE, write_capture
+from .const import (
+    DOMAIN,
+    SERVICE_REDISCOVER,
+    SERVICE_SET_OUTPUTS,
+    SERVICE_START_CAPTURE,
+    SERVICE_DUMP_CAPTURE,
+)
+from .discovery import DIMMER_STOP, DIMMER_CONTINU
+from .network import DomestiaConnectionError
+from .protocol import build_write_output, DIMMER_MAX_LEVEL, RELAIS_ON, COVER_MOVE
+
+_LOGGER = logging.getLogger(__name__)
+
+SET_OUTPUTS_SCHEMA = vol.Schema({
+    vol.Required("outputs"): vol.All(cv.ensure_list, [vol.Schema({
+        vol.Required("entity_id"): cv.entity_id,
+        vol.Optional("state"): cv.boolean,
+        vol.Optional("brightness"): vol.All(vol.Coerce(int), vol.Range(min=0, max=255)),
+        vol.Optional("position"): vol.All(vol.Coerce(int), vol.Range(min=0, max=100)),
+    })]),
+})
+
+START_CAPTURE_SCHEMA = vol.Schema({
+    vol.Optional("max_frames", default=DEFAULT_CAPTURE_SIZE): vol.All(
+        vol.Coerce(int), vol.Range(min=100, max=1000000)
+    ),
+})
+
+DUMP_CAPTURE_SCHEMA = vol.Schema({
+    vol.Optional("stop", default=False): cv.boolean,
+})
+
+
+def async_setup_services(hass: HomeAssistant):
+    """Register the Domestia services."""
+
+    async def handle_rediscover(call: ServiceCall):
+        """Drop the discovery cache and reload, so all names are read again."""
+        for entry in hass.config_entries.async_entries(DOMAIN):
+            data = hass.data.get(DOMAIN, {}).get(entry.entry_id)
+            if data is None:
+                continue
+            await data["discovery"].clear_cache()
+            await hass.config_entries.async_reload(entry.entry_id)
+
+    async def handle_set_outputs(call: ServiceCall):
+        """Write many outputs in one burst and confirm them with one poll."""
+        writes = {}
+        for item in call.data["outputs"]:
+            data, output = _resolve_output(hass, item["entity_id"])
+            writes.setdefault(id(data), (data, []))[1].append((output, *_output_value(output, item)))
+
+        for data, entries in writes.values():
+            network = data["network"]
+            coordinator = data["coordinator"]
+
+            # A running fade or a debounced write would overwrite the bulk value
+            for output, _, _ in entries:
+                coordinator.transitions.stop(output.id)
+                coordinator.commands.cancel(output.id)
+
+            # Writes do not wait for a reply, so they go out back to back
+            try:
+                for output, value, state in entries:
+                    await network.send(build_write_output(output.id, value))
+            except DomestiaConnectionError as e:
+                raise HomeAssistantError(str(e)) from e
+
+            for output, value, state in entries:
+                coordinator.expect(output, **state)
+
+            # All entities in one pass, then one shared confirmation poll
+            coordinator.async_notify_outputs({output.id for output, _, _ in entries})
+            await coordinator.async_request_refresh()
+
+    async def handle_start_capture(call: ServiceCall):
+        """Record the raw controller traffic into a ring buffer."""
+        for data in hass.data.get(DOMAIN, {}).values():
+            data["network"].start_capture(call.data["max_frames"])
+
+    async def handle_dump_capture(call: ServiceCall):
+        """Write the captured traffic to a file in the config directory."""
+        for data in hass.data.get(DOMAIN, {}).values():
+            network = data["network"]
+            capture = network.stop_capture() if call.data["stop"] else network.capture
+            if capture is None:
+                raise HomeAssistantError("No capture running, call domestia.start_capture first")
+
+            # Outputs go in the header so the capture replays without discovery
+            outputs = data["outputs"]
+            header = {"ip": network.ip, "mac": network.mac, "types": outputs.types, "names": outputs.names}
+
+            stamp = time.strftime("%Y%m%d_%H%M%S")
+            path = hass.config.path(f"domestia_capture_{network.mac.replace(':', '').lower()}_{stamp}.jsonl")
+            await hass.async_add_executor_job(write_capture, path, header, capture, capture.snapshot())
+            _LOGGER.info(f"Wrote {len(capture)} captured frames to {path}")
+
+    hass.services.async_register(DOMAIN, SERVICE_REDISCOVER, handle_rediscover)
+    hass.services.async_register(
+        DOMAIN, SERVICE_SET_OUTPUTS, handle_set_outputs, schema=SET_OUTPUTS_SCHEMA
+    )
+    hass.services.async_register(
+        DOMAIN, SERVICE_START_CAPTURE, handle_start_capture, schema=START_CAPTURE_SCHEMA
+    )
+    hass.services.async_register(
+        DOMAIN, SERVICE_DUMP_CAPTURE, handle_dump_capture, schema=DUMP_CAPTURE_SCHEMA
+    )
+
+
+def _resolve_output(hass, entity_id):
+    entity = er.async_get(hass).async_get(entity_id)
+    if entity is None or entity.platform != DOMAIN:
+        raise HomeAssistantError(f"{entity_id} is not a Domestia entity")
+    if entity.domain not in ("light", "cover"):
+        raise HomeAssistantError(f"{entity_id} is not a Domestia light or cover")
+
+    data = hass.data.get(DOMAIN, {}).get(entity.config_entry_id)
+    if data is None:
+        raise HomeAssistantError(f"{entity_id} is not loaded")
+
+    # unique_id is domestia_<platform>_<output id>
+    output_id = int(entity.unique_id.rsplit("_", 1)[1])
+    return data, data["outputs"][output_id]
+
+
+def _output_value(output, item):
+    """Status byte to write and the state it should produce."""
+    if output.category == "cover":
+        if "position" in item:
+            position = item["position"]
+        elif "state" in item:
+            position = 100 if item["state"] else 0
+        else:
+            raise HomeAssistantError(f"No position or state for cover {output.id}")
+        return position + COVER_MOVE, {}
+
+    if output.category != "light":
+        raise HomeAssistantError(f"Output {output.id} cannot be set")
+
+    brightness = item.get("brightness")
+    if item.get("state") is False or brightness == 0:
+        return 0, {"is_on": False}
+
+    if output.type in (DIMMER_STOP, DIMMER_CONTINU):
+        if brightness is None:
+            brightness = output.brightness
+        return round(brightness * DIMMER_MAX_LEVEL / 255), {"is_on": True, "brightness": brightness}
+
+    return RELAIS_ON, {"is_on": True}
@@ -0,0 +1,157 @@
+"""State store for the Domestia outputs.
+
+One record per output, indexed by output id and by category. Records use
+__slots__ so hundreds of outputs stay small and attribute reads stay cheap.
+"""
+
+from .protocol import CHAUD_VEROUILLE
+
+# Plausible thermostat values in degrees; anything else is shown as unknown
+TEMPERATURE_RANGE = (0, 50)
+SETPOINT_RANGE = (5, 35)
+
+
+class DomestiaOutput:
+    """One controller output and its last known state."""
+
+    __slots__ = (
+        "id",
+        "type",
+        "category",
+        "name",
+        "partner",
+        "is_on",
+        "brightness",
+        "position",
+        "closing",
+        "opening",
+        "temperature",
+        "target_temperature",
+        "mode",
+    )
+
+    def __init__(self, output_id, output_type, category, name=None):
+        self.id = output_id
+        self.type = output_type
+        self.category = category
+        self.name = name
+
+        # Cover: id of the paired VOLET_MONTE output, set by discovery
+        self.partner = None
+
+        self.is_on = False
+        self.brightness = 255  # Last brightness sent to a dimmer
+        self.position = 50
+        self.closing = False
+        self.opening = False
+
+        # Thermostat, None until the first thermostat poll
+        self.temperature = None
+        self.target_temperature = None
+        self.mode = None
+
+    def apply(self, states):
+        """Decode this output from the ATRRELAIS status bytes."""
+        if self.category == "light":
+            self.is_on = states[self.id] != 0
+
+        elif self.category == "cover":
+            value = states[self.id]
+            self.position = value & 0x7F
+            self.closing = value >= 128
+            self.opening = self.partner is not None and self.partner < len(states) and states[self.partner] >= 128
+
+    def apply_thermostat(self, temperatures, status):
+        """Decode a thermostat from the ATTEMP and ATRTEMPSTATUS payloads.
+
+        Temperatures hold one byte per output, the status two (setpoint,
+        mode); temperatures are in half degrees. Implausible values are
+        stored as unknown. Returns True on a change.
+        """
+        i = self.id
+        if i >= len(temperatures) or 2 * i + 1 >= len(status):
+            return False
+
+        values = (temperatures[i] / 2, status[2 * i] / 2, status[2 * i + 1])
+        if not (
+            TEMPERATURE_RANGE[0] <= values[0] <= TEMPERATURE_RANGE[1]
+            and SETPOINT_RANGE[0] <= values[1] <= SETPOINT_RANGE[1]
+            and values[2] <= CHAUD_VEROUILLE
+        ):
+            values = (None, None, None)
+
+        if values == (self.temperature, self.target_temperature, self.mode):
+            return False
+
+        self.temperature, self.target_temperature, self.mode = values
+        return True
+
+
+class DomestiaOutputs:
+    """All outputs of one controller."""
+
+    def __init__(self, outputs):
+        self._outputs = outputs
+        self._by_category = {}
+
+        # Status byte index -> outputs decoded from it
+        self._by_status_byte = {}
+
+        for output in outputs:
+            self._by_category.setdefault(output.category, []).append(output)
+
+            if output.category in ("light", "cover"):
+                self._by_status_byte.setdefault(output.id, []).append(output)
+            if output.partner is not None:
+                self._by_status_byte.setdefault(output.partner, []).append(output)
+
+    def __iter__(self):
+        return iter(self._outputs)
+
+    def __len__(self):
+        return len(self._outputs)
+
+    def __getitem__(self, output_id):
+        return self._outputs[output_id]
+
+    def category(self, category):
+        return self._by_category.get(category, [])
+
+    @property
+    def types(self):
+        return [output.type for output in self._outputs]
+
+    @property
+    def names(self):
+        return [output.name for output in self._outputs]
+
+    def apply_status(self, states, changed_bytes):
+        """Decode the outputs behind changed status bytes, return their ids."""
+        changed_ids = set()
+        size = len(states)
+
+        for i in changed_bytes:
+            for output in self._by_status_byte.get(i, ()):
+                if output.id not in changed_ids and output.id < size:
+                    changed_ids.add(output.id)
+                    output.apply(states)
+
+        return changed_ids
+
+    def apply_thermostats(self, temperatures, status):
+        """Decode all thermostats, return the ids of those that changed.
+
+        Raises ValueError when the replies do not hold one temperature and
+        one setpoint/mode pair per output.
+        """
+        if len(temperatures) != len(self) or len(status) != 2 * len(self):
+            raise ValueError(
+                f"thermostat replies of {len(temperatures)} and {len(status)} bytes "
+                f"do not match {len(self)} outputs"
+            )
+
+        return {
+            output.id
+            for output in self.category("climate")
+            if output.apply_thermostat(temperatures, status)
+        }
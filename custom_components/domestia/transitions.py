@@ -0,0 +1,107 @@
+"""Dimmer transitions as a rate-limited stream of level writes.
+
+The controller has no fade command, so a transition is a series of
+ATWRELAIS level writes. One task steps all running fades together: every
+TRANSITION_TICK it sends the dimmers whose level is furthest behind, at
+most MAX_FADE_WRITES_PER_SECOND writes in total, so many dimmers fading at
+once cannot flood the controller. When the last fade ends, one
+confirmation poll is requested.
+"""
+
+import asyncio
+import logging
+import time
+
+from .const import TRANSITION_TICK, MAX_FADE_WRITES_PER_SECOND
+from .network import DomestiaConnectionError
+from .protocol import build_write_output
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class _Fade:
+    """Level ramp of one dimmer."""
+
+    __slots__ = ("output_id", "start_level", "target_level", "start", "duration", "sent_level")
+
+    def __init__(self, output_id, start_level, target_level, start, duration):
+        self.output_id = output_id
+        self.start_level = start_level
+        self.target_level = target_level
+        self.start = start
+        self.duration = duration
+        self.sent_level = start_level
+
+    def level(self, now):
+        progress = min(1.0, (now - self.start) / self.duration)
+        return round(self.start_level + (self.target_level - self.start_level) * progress)
+
+
+class DimmerTransitions:
+    """Runs the fades of one controller."""
+
+    def __init__(self, hass, network, on_done):
+        self.hass = hass
+        self.network = network
+        self._on_done = on_done
+
+        # Output id -> _Fade
+        self._fades = {}
+        self._task = None
+
+    def __len__(self):
+        """Number of running fades."""
+        return len(self._fades)
+
+    def start(self, output_id, start_level, target_level, duration):
+        """Fade a dimmer between two levels (0-64) over duration seconds."""
+        self._fades[output_id] = _Fade(
+            output_id, start_level, target_level, time.monotonic(), duration
+        )
+
+        if self._task is None:
+            self._task = self.hass.async_create_task(self._run())
+
+    def stop(self, output_id):
+        """Stop a fade, e.g. because the light got a direct command."""
+        self._fades.pop(output_id, None)
+
+    def cancel(self):
+        self._fades.clear()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        budget = max(1, round(MAX_FADE_WRITES_PER_SECOND * TRANSITION_TICK))
+
+        try:
+            while self._fades:
+                now = time.monotonic()
+
+                behind = []
+                for fade in self._fades.values():
+                    level = fade.level(now)
+                    if level != fade.sent_level:
+                        behind.append((abs(level - fade.sent_level), fade, level))
+
+                # Furthest behind first; the rest catch up on the next tick
+                behind.sort(key=lambda item: item[0], reverse=True)
+                for _, fade, level in behind[:budget]:
+                    await self.network.send(build_write_output(fade.output_id, level))
+                    fade.sent_level = level
+
+                for output_id, fade in list(self._fades.items()):
+                    if fade.sent_level == fade.target_level and now >= fade.start + fade.duration:
+                        del self._fades[output_id]
+
+                if self._fades:
+                    await asyncio.sleep(TRANSITION_TICK)
+
+        except DomestiaConnectionError as e:
+            _LOGGER.warning(f"Transitions stopped: {e}")
+            self._fades.clear()
+        finally:
+            self._task = None
+
+        await self._on_done()
@@ -0,0 +1,70 @@
+"""Client side travel model for covers.
+
+The controller only reports a shutter's position when it is polled. While
+a shutter moves, the model extrapolates from the last polled position at
+a speed learned from earlier polls, so the position in Home Assistant
+moves smoothly without polling the controller faster. Every poll resets
+the estimate to the reported position.
+"""
+
+# Weight of a new speed sample in the running average
+SPEED_SMOOTHING = 0.3
+
+CLOSING = -1
+OPENING = 1
+
+
+class CoverTravel:
+    """Travel speed and last known position of one cover."""
+
+    __slots__ = ("speed", "target", "_position", "_time", "_direction")
+
+    def __init__(self):
+        self.speed = None  # Percent per second, None until calibrated
+        self.target = None  # Commanded position, if known
+
+        self._position = None
+        self._time = None
+        self._direction = 0
+
+    @property
+    def moving(self):
+        return self._direction != 0
+
+    def observe(self, position, closing, opening, now):
+        """Anchor the model on a polled position and learn the speed."""
+        direction = CLOSING if closing else OPENING if opening else 0
+
+        # Two polls while moving the same way give one speed sample
+        if direction and direction == self._direction:
+            elapsed = now - self._time
+            moved = (position - self._position) * direction
+            if elapsed > 0 and moved > 0:
+                sample = moved / elapsed
+                if self.speed is None:
+                    self.speed = sample
+                else:
+                    self.speed += SPEED_SMOOTHING * (sample - self.speed)
+
+        self._position = position
+        self._time = now
+        self._direction = direction
+        if not direction:
+            self.target = None
+
+    def estimate(self, now):
+        """Estimated position, or None when not moving or not calibrated."""
+        if not self._direction or self.speed is None:
+            return None
+
+        position = self._position + self._direction * self.speed * (now - self._time)
+
+        low, high = 0, 100
+        # Stop at the commanded position if the cover is heading for it
+        if self.target is not None:
+            if self._direction == CLOSING and self.target <= self._position:
+                low = self.target
+            elif self._direction == OPENING and self.target >= self._position:
+                high = self.target
+
+        return round(max(low, min(high, position)))
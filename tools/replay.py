@@ -0,0 +1,224 @@
+"""Replay a wire capture offline.
+
+Captures are written by the domestia.dump_capture service. The received
+chunks go through the integration's FrameDecoder in the order and
+segmentation they arrived in, replies are matched to their requests, and
+the status replies and pushed status frames are fed in order to a real
+DomestiaCoordinator, which prints
+every output state change it reports:
+
+    python -m tools.replay domestia_capture_001122334455_20240101_120000.jsonl
+
+Home Assistant has to be installed (pip install homeassistant), because
+the coordinator runs for real.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import tempfile
+from collections import deque
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.domestia.capture import read_capture, TX, RX
+from custom_components.domestia.coordinator import DomestiaCoordinator
+from custom_components.domestia.discovery import DomestiaDiscovery
+from custom_components.domestia.flow import FlowControl
+from custom_components.domestia.metrics import DomestiaMetrics
+from custom_components.domestia.protocol import (
+    ATRRELAIS,
+    ATRSTYPE,
+    ATTEMP,
+    ATWCAPTEURMODE,
+    ATWRELAIS,
+    ATWTEMPMODE,
+    CMD_ATRRELAIS,
+    CMD_ATRTEMPSTATUS,
+    CMD_ATTEMP,
+    FRAME_START,
+    FrameDecoder,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+# The controller does not answer writes
+WRITE_COMMANDS = (ATWRELAIS, ATWTEMPMODE, ATWCAPTEURMODE)
+
+
+def reply_frame(payload):
+    """A reply frame as FrameDecoder returns it, without request id."""
+    return bytes((FRAME_START, *len(payload).to_bytes(3, "big"), *payload, sum(payload) % 256))
+
+
+class Replay:
+    """Decoded capture: replies per command and the decoder statistics."""
+
+    def __init__(self, frames):
+        self.decoder = FrameDecoder()
+        self.metrics = DomestiaMetrics()
+        self.replies = {}
+        self.unanswered = 0
+        self.unexpected = 0
+        self.pushes = 0
+        self.requests = 0
+        # Counted here, the replay consumes the reply queues
+        self.answered = 0
+        status_size = None
+
+        pending = {}
+        for t, direction, data in frames:
+            if direction == TX:
+                self.requests += 1
+                command = data[4]
+                if command in WRITE_COMMANDS:
+                    continue
+                # A request id is only reused once its request is gone
+                if data[-1] in pending:
+                    self.unanswered += 1
+                pending[data[-1]] = (t, command)
+
+            elif direction == RX:
+                for req_id, frame in self.decoder.feed(data):
+                    request = pending.pop(req_id, None)
+                    if request is None:
+                        # Pushed status frames have the size of a status reply
+                        if len(frame) == status_size:
+                            self.pushes += 1
+                            self.replies[ATRRELAIS].append((t, frame))
+                        else:
+                            self.unexpected += 1
+                        continue
+                    sent, command = request
+                    self.answered += 1
+                    if command == ATRRELAIS:
+                        status_size = len(frame)
+                    self.metrics.record_rtt(command, t - sent)
+                    self.replies.setdefault(command, deque()).append((t, frame))
+
+        self.unanswered += len(pending)
+
+    def summary(self):
+        return {
+            "requests": self.requests,
+            "replies": self.answered,
+            "unanswered": self.unanswered,
+            "pushed_status_frames": self.pushes,
+            "unexpected_replies": self.unexpected,
+            "crc_errors": self.decoder.crc_errors,
+            "dropped_bytes": self.decoder.dropped_bytes,
+            "rtt_by_command": {
+                str(c): h.as_dict() for c, h in self.metrics.rtt_by_command.items()
+            },
+        }
+
+
+class ReplayNetwork:
+    """Serves captured replies to discovery and the coordinator."""
+
+    def __init__(self, replies, ip, mac):
+        self.replies = replies
+        self.ip = ip
+        self.mac = mac
+        self.metrics = DomestiaMetrics()
+        self.flow = FlowControl(1)
+        self.now = 0.0  # Capture time of the last reply served
+
+    def add_state_listener(self, listener):
+        return lambda: None
+
+    def add_push_listener(self, listener):
+        return lambda: None
+
+    async def send(self, request, wait_reply=False, timeout=None, priority=None):
+        if not wait_reply:
+            return None
+
+        queue = self.replies.get(request.command)
+        if not queue:
+            raise asyncio.TimeoutError()
+
+        self.now, frame = queue.popleft()
+        return frame
+
+    async def read_relais_status(self, timeout=None, priority=None):
+        return await self.send(CMD_ATRRELAIS, wait_reply=True)
+
+    async def read_thermostats(self, timeout=None, priority=None):
+        return (
+            await self.send(CMD_ATTEMP, wait_reply=True),
+            await self.send(CMD_ATRTEMPSTATUS, wait_reply=True),
+        )
+
+
+def describe(output):
+    if output.category == "light":
+        return f"on={output.is_on}"
+    if output.category == "cover":
+        return f"position={output.position} closing={output.closing} opening={output.opening}"
+    if output.category == "climate":
+        return f"temperature={output.temperature} target={output.target_temperature} mode={output.mode}"
+    return ""
+
+
+async def replay(args):
+    header, frames = read_capture(args.capture)
+    decoded = Replay(frames)
+
+    replies = decoded.replies
+    if header.get("types"):
+        # The outputs as the integration knew them when the capture was written
+        replies[ATRSTYPE] = deque([(0.0, reply_frame(bytes(header["types"])))])
+
+    network = ReplayNetwork(replies, header.get("ip"), header.get("mac", ""))
+    outputs = await DomestiaDiscovery(network).load_outputs()
+    for output, name in zip(outputs, header.get("names", ())):
+        output.name = name
+
+    # Status frames and thermostat reads in capture order; the
+    # coordinator reads thermostats on a timer of its own
+    events = sorted(
+        [(t, False) for t, _ in replies.get(ATRRELAIS, ())]
+        + [(t, True) for t, _ in replies.get(ATTEMP, ())]
+    )
+    polls = len(replies.get(ATRRELAIS, ()))
+    print(f"Replaying {polls} status frames for {len(outputs)} outputs")
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        coordinator = DomestiaCoordinator(hass, network, outputs, args.scan_interval, args.verbose)
+
+        for output in outputs:
+            if output.category in ("light", "cover", "climate"):
+                coordinator.async_add_listener(
+                    lambda output=output: print(
+                        f"{network.now:10.3f}  {output.id:3d} {output.name or '?':24.24} {describe(output)}"
+                    ),
+                    context=output.id,
+                )
+
+        for _, thermostats in events:
+            if thermostats:
+                await coordinator.async_read_thermostats()
+            else:
+                await coordinator.async_refresh()
+
+        coordinator.unsub_network()
+        await coordinator.async_shutdown()
+
+    print(json.dumps(decoded.summary(), indent=2))
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Replay a Domestia wire capture")
+    parser.add_argument("capture", help="capture file written by domestia.dump_capture")
+    parser.add_argument("--scan-interval", type=int, default=5, help="idle scan interval for the coordinator")
+    parser.add_argument("--verbose", action="store_true", help="coordinator debug logging")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+    asyncio.run(replay(args))
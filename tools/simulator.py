@@ -0,0 +1,493 @@
+"""Local Domestia controller simulator.
+
+Speaks the controller's TCP protocol well enough to run the integration,
+its discovery and the coordinator without hardware:
+
+    python -m tools.simulator --outputs 64 --port 52001
+
+Frames are 255, length (3 bytes), payload, CRC, request id; replies carry
+the request id of the request they answer. Supported commands:
+
+- CMD_ATRSTYPE (66): output type table
+- ATRNOMS (62): output name
+- ATRRELAIS (156): status table
+- ATWRELAIS (150): write an output (no reply)
+- ATWTEMPMODE (58) / ATWCAPTEURMODE (85): thermostat setpoint and mode
+  (no reply)
+- CMD_ATTEMP (29) / CMD_ATRTEMPSTATUS (59): thermostat temperatures, and
+  setpoints with modes
+- CMD_ATMAC (0x8A): MAC address
+
+Shutters move over time. Latency, dropped replies, coalesced or split TCP
+segments and disconnects can be injected to test robustness. With push,
+wall button presses send the status table unasked, with request id 255;
+--press-every presses a random light's button at an interval.
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+# Output types, as in custom_components/domestia/discovery.py
+RELAIS = 1
+DIMMER_STOP = 6
+VOLET_DESCENTE = 8
+VOLET_MONTE = 9
+VOLET_UN_BP = 10
+RELAIS_CAPTEUR = 11
+UNUSED = 255
+
+# Commands
+ATTEMP = 29
+ATWTEMPMODE = 58
+ATRTEMPSTATUS = 59
+ATRNOMS = 62
+ATRSTYPE = 66
+ATWCAPTEURMODE = 85
+ATMAC = 0x8A
+ATWRELAIS = 150
+ATRRELAIS = 156
+
+# Repeating layout used by --outputs: lights, a dimmer, a shutter pair and
+# a thermostat
+DEFAULT_PATTERN = [RELAIS, RELAIS, DIMMER_STOP, VOLET_DESCENTE, VOLET_MONTE, RELAIS_CAPTEUR, RELAIS, RELAIS]
+
+NAME_SIZE = 16
+
+# Request id of unsolicited status frames; clients only use 0-254
+PUSH_REQUEST_ID = 255
+
+
+def build_frame(payload, request_id):
+    """Frame a reply the way the controller does."""
+    length = len(payload)
+    frame = bytearray([255, (length >> 16) & 0xFF, (length >> 8) & 0xFF, length & 0xFF])
+    frame += bytes(payload)
+    frame.append(sum(payload) % 256)
+    frame.append(request_id)
+    return bytes(frame)
+
+
+def default_layout(count):
+    layout = [DEFAULT_PATTERN[i % len(DEFAULT_PATTERN)] for i in range(count)]
+    # Do not cut a shutter pair in half
+    if layout and layout[-1] == VOLET_DESCENTE:
+        layout[-1] = RELAIS
+    return layout
+
+
+class SimulatedOutput:
+    """State of one simulated output."""
+
+    __slots__ = ("id", "type", "name", "value", "position", "target", "moved_at", "temperature", "setpoint", "mode")
+
+    def __init__(self, output_id, output_type, name):
+        self.id = output_id
+        self.type = output_type
+        self.name = name
+        self.value = 0
+        self.position = 0
+        self.target = None
+        self.moved_at = 0.0
+        self.temperature = 20.0
+        self.setpoint = 20.0
+        self.mode = 0
+
+
+class DomestiaSimulator:
+    """An asyncio TCP server that behaves like a Domestia controller."""
+
+    def __init__(
+        self,
+        layout=None,
+        outputs=16,
+        travel_time=20.0,
+        latency=0.0,
+        jitter=0.0,
+        drop_rate=0.0,
+        coalesce=0.0,
+        split=False,
+        disconnect_after=None,
+        push=False,
+        mac="00:11:22:33:44:55",
+        seed=None,
+    ):
+        self.layout = list(layout) if layout is not None else default_layout(outputs)
+        self.outputs = [
+            SimulatedOutput(i, t, f"Output {i + 1}") for i, t in enumerate(self.layout)
+        ]
+        self.travel_time = travel_time
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.coalesce = coalesce
+        self.split = split
+        self.disconnect_after = disconnect_after
+        self.push = push
+        self.mac = mac
+
+        self.requests = 0
+        self.replies = 0
+        self.dropped = 0
+
+        self._random = random.Random(seed)
+        self._server = None
+        self._writers = set()
+        self._connections = set()
+
+    # ---------------------------------------------------------
+    # SERVER
+    # ---------------------------------------------------------
+    async def start(self, host="127.0.0.1", port=0):
+        self._server = await asyncio.start_server(self._handle_client, host, port)
+        return self.port
+
+    @property
+    def port(self):
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.disconnect_all()
+        self._server.close()
+        await self._server.wait_closed()
+        # Let the client handlers see their connection close
+        await asyncio.sleep(0.01)
+
+    def disconnect_all(self):
+        """Drop every client connection, like a controller reboot."""
+        for writer in list(self._writers):
+            writer.close()
+
+    async def _handle_client(self, reader, writer):
+        self._writers.add(writer)
+        connection = _Connection(self, writer)
+        self._connections.add(connection)
+        buffer = bytearray()
+        disconnect_at = None
+        if self.disconnect_after:
+            disconnect_at = time.monotonic() + self.disconnect_after
+
+        try:
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                buffer += data
+
+                while len(buffer) >= 4:
+                    if buffer[0] != 255:
+                        del buffer[0]
+                        continue
+                    length = int.from_bytes(buffer[1:4], "big")
+                    end = 4 + length + 2
+                    if len(buffer) < end:
+                        break
+                    frame = bytes(buffer[:end])
+                    del buffer[:end]
+                    self._handle_frame(connection, frame)
+
+                if disconnect_at and time.monotonic() >= disconnect_at:
+                    _LOGGER.info("Injected disconnect")
+                    break
+        finally:
+            self._writers.discard(writer)
+            self._connections.discard(connection)
+            connection.close()
+            writer.close()
+
+    def _handle_frame(self, connection, frame):
+        self.requests += 1
+        payload = frame[4:-2]
+        request_id = frame[-1]
+
+        if sum(payload) % 256 != frame[-2]:
+            _LOGGER.warning(f"CRC error in request {request_id}")
+            return
+
+        reply = self.handle_command(payload)
+        if reply is None:
+            return
+
+        if self.drop_rate and self._random.random() < self.drop_rate:
+            self.dropped += 1
+            return
+
+        delay = self.latency + self._random.uniform(0, self.jitter) if self.jitter else self.latency
+        connection.reply(build_frame(reply, request_id), delay)
+
+    # ---------------------------------------------------------
+    # COMMANDS
+    # ---------------------------------------------------------
+    def handle_command(self, payload):
+        """Execute one request and return the reply payload, or None."""
+        command = payload[0]
+
+        if command == ATRSTYPE:
+            return bytes(self.layout)
+
+        if command == ATRNOMS:
+            output = self._output(payload[1])
+            if output is None:
+                return None
+            # Always keep a 255 terminator in front of the CRC
+            name = output.name.encode("latin-1")[:NAME_SIZE - 1]
+            return name + b"\xff" * (NAME_SIZE - len(name))
+
+        if command == ATRRELAIS:
+            return self.status_table()
+
+        if command == ATWRELAIS:
+            output = self._output(payload[1])
+            if output is not None:
+                self.write_output(output, payload[2])
+            return None
+
+        if command == ATWTEMPMODE:
+            output = self._output(payload[1])
+            if output is not None:
+                output.setpoint = payload[2] / 2
+            return None
+
+        if command == ATWCAPTEURMODE:
+            output = self._output(payload[1])
+            if output is not None:
+                output.mode = payload[2]
+            return None
+
+        if command == ATTEMP:
+            return bytes(
+                round(o.temperature * 2) if o.type == RELAIS_CAPTEUR else 0 for o in self.outputs
+            )
+
+        if command == ATRTEMPSTATUS:
+            status = bytearray()
+            for o in self.outputs:
+                if o.type == RELAIS_CAPTEUR:
+                    status += bytes([round(o.setpoint * 2), o.mode])
+                else:
+                    status += b"\x00\x00"
+            return bytes(status)
+
+        if command == ATMAC:
+            return bytes(int(part, 16) for part in self.mac.split(":"))
+
+        _LOGGER.debug(f"Unknown command {command}")
+        return None
+
+    def _output(self, number):
+        """Commands use 1-based output numbers."""
+        if 1 <= number <= len(self.outputs):
+            return self.outputs[number - 1]
+        return None
+
+    def write_output(self, output, value):
+        if output.type in (VOLET_DESCENTE, VOLET_UN_BP):
+            self._update_cover(output)
+            if value >= 128:
+                output.target = min(value - 128, 100)
+            else:
+                # Any write without the move flag stops the shutter
+                output.target = None
+        else:
+            output.value = value
+
+    def press(self, output_id):
+        """Toggle an output as a wall button would."""
+        output = self.outputs[output_id]
+        output.value = 0 if output.value else 0xFE
+        if self.push:
+            self.push_status()
+
+    def press_random(self):
+        """Press the wall button of a random light."""
+        lights = [o.id for o in self.outputs if o.type in (RELAIS, DIMMER_STOP)]
+        if lights:
+            self.press(self._random.choice(lights))
+
+    def push_status(self):
+        """Send the status table to every client without a request."""
+        frame = build_frame(self.status_table(), PUSH_REQUEST_ID)
+        for connection in list(self._connections):
+            connection.reply(frame, 0)
+
+    # ---------------------------------------------------------
+    # STATUS
+    # ---------------------------------------------------------
+    def _update_cover(self, output):
+        """Advance a moving shutter to the current time."""
+        now = time.monotonic()
+        elapsed = now - output.moved_at
+        output.moved_at = now
+
+        if output.target is None:
+            return
+
+        step = elapsed * 100 / self.travel_time
+        if output.target > output.position:
+            output.position = min(output.target, output.position + step)
+        else:
+            output.position = max(output.target, output.position - step)
+
+        if abs(output.position - output.target) < 1e-6:
+            output.position = output.target
+            output.target = None
+
+    def output_values(self):
+        """One status byte per output id."""
+        values = bytearray(len(self.outputs))
+
+        for output in self.outputs:
+            if output.type in (VOLET_DESCENTE, VOLET_UN_BP):
+                self._update_cover(output)
+                value = int(output.position)
+                if output.target is not None and output.target < output.position:
+                    value |= 0x80  # closing
+                values[output.id] = value
+
+                up = output.id + 1
+                if output.type == VOLET_DESCENTE and up < len(self.outputs):
+                    opening = output.target is not None and output.target > output.position
+                    values[up] = 0x80 if opening else 0
+
+            elif output.type != VOLET_MONTE:
+                values[output.id] = output.value
+
+        return values
+
+    def status_table(self):
+        """ATRRELAIS reply payload.
+
+        The integration reads the status of output id at frame[3 + id], so
+        output 0 shares its byte with the length field and payload[i] holds
+        output i + 1.
+        """
+        return bytes(self.output_values()[1:])
+
+
+class _Connection:
+    """Reply writer for one client, with segmentation faults."""
+
+    def __init__(self, simulator, writer):
+        self.simulator = simulator
+        self.writer = writer
+        self._pending = bytearray()
+        self._flush_handle = None
+        self._tail = None
+        self._closed = False
+
+    def reply(self, frame, delay):
+        loop = asyncio.get_running_loop()
+        if delay:
+            loop.call_later(delay, self._queue, frame)
+        else:
+            self._queue(frame)
+
+    def _queue(self, frame):
+        if self._closed:
+            return
+        self.simulator.replies += 1
+
+        if self.simulator.coalesce:
+            # Hold replies back so several arrive in one TCP segment
+            self._pending += frame
+            if self._flush_handle is None:
+                loop = asyncio.get_running_loop()
+                self._flush_handle = loop.call_later(self.simulator.coalesce, self._flush)
+            return
+
+        self._write(frame)
+
+    def _flush(self):
+        self._flush_handle = None
+        if self._pending and not self._closed:
+            self._write(bytes(self._pending))
+        self._pending.clear()
+
+    def _write(self, data):
+        if not self.simulator.split or len(data) < 2:
+            self._write_raw(data)
+            return
+
+        if self._tail is not None:
+            # Keep the stream in order behind the segment still on its way
+            self._tail += data
+            return
+
+        # Cut the data in two segments that arrive separately
+        middle = len(data) // 2
+        self._write_raw(data[:middle])
+        self._tail = bytearray(data[middle:])
+        asyncio.get_running_loop().call_later(0.005, self._write_tail)
+
+    def _write_tail(self):
+        tail, self._tail = self._tail, None
+        self._write_raw(bytes(tail))
+
+    def _write_raw(self, data):
+        if not self._closed:
+            self.writer.write(data)
+
+    def close(self):
+        self._closed = True
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Simulate a Domestia controller")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=52001)
+    parser.add_argument("--outputs", type=int, default=16, help="number of outputs")
+    parser.add_argument("--layout", help="comma separated output types, overrides --outputs")
+    parser.add_argument("--travel-time", type=float, default=20.0, help="shutter travel time in seconds")
+    parser.add_argument("--latency", type=float, default=0.0, help="reply delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay in seconds")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of replies to drop")
+    parser.add_argument("--coalesce", type=float, default=0.0, help="batch replies for this many seconds")
+    parser.add_argument("--split", action="store_true", help="split every reply over two segments")
+    parser.add_argument("--disconnect-after", type=float, help="drop clients after this many seconds")
+    parser.add_argument("--push", action="store_true", help="push the status table on wall button presses")
+    parser.add_argument("--press-every", type=float, help="press a random light's wall button every this many seconds")
+    parser.add_argument("--seed", type=int)
+    return parser.parse_args()
+
+
+async def _main(args):
+    layout = [int(t) for t in args.layout.split(",")] if args.layout else None
+    simulator = DomestiaSimulator(
+        layout=layout,
+        outputs=args.outputs,
+        travel_time=args.travel_time,
+        latency=args.latency,
+        jitter=args.jitter,
+        drop_rate=args.drop_rate,
+        coalesce=args.coalesce,
+        split=args.split,
+        disconnect_after=args.disconnect_after,
+        push=args.push,
+        seed=args.seed,
+    )
+    await simulator.start(args.host, args.port)
+    _LOGGER.info(f"Simulating {len(simulator.outputs)} outputs on {args.host}:{simulator.port}")
+
+    try:
+        if args.press_every:
+            while True:
+                await asyncio.sleep(args.press_every)
+                simulator.press_random()
+        else:
+            await asyncio.Event().wait()
+    finally:
+        await simulator.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_main(_parse_args()))
+    except KeyboardInterrupt:
+        pass